@@ -1,10 +1,10 @@
 import os
 import sys
 import random
-import requests
 import urllib3
 from supabase import create_client, Client
 from matrix_config import config
+from matrix_tavily import TavilyClient, TavilyError
 
 # Disable warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -37,6 +37,9 @@ def main():
         print("[X] CRITICAL: TAVILY_KEY not found. Cannot perform live audit.")
         return
 
+    # Shared result cache: re-running the audit on overlapping samples costs no extra credits
+    tavily = TavilyClient([tavily_key], timeout=10)
+
     try:
         supabase: Client = create_client(supabase_url, supabase_key)
     except Exception as e:
@@ -74,56 +77,45 @@ def main():
     for item in samples:
         kw = item['keyword']
         search_query = f"site:.gov filetype:pdf {kw} report handbook"
-        tavily_url = "https://api.tavily.com/search"
-        payload = {
-            "api_key": tavily_key,
-            "query": search_query,
-            "max_results": 3,
-            "search_depth": "advanced"
-        }
         
         status = "UNKNOWN"
         note = ""
         
         try:
-            r = requests.post(tavily_url, json=payload, timeout=10)
-            if r.status_code != 200:
-                status = "D (API Error)"
-                note = f"Status {r.status_code}"
-                results["D"] += 1
+            data = tavily.search(search_query, max_results=3, search_depth="advanced")
+            tav_results = data.get('results', [])
+            
+            if not tav_results:
+                # Try broader search without filetype:pdf to see if HTML exists
+                data2 = tavily.search(f"site:.gov {kw} requirements", max_results=3, search_depth="advanced")
+                if data2.get('results'):
+                    status = "B (HTML Found)"
+                    note = data2['results'][0]['url']
+                    results["B"] += 1
+                else:
+                    status = "C (Nothing)"
+                    note = "No relevant gov results"
+                    results["C"] += 1
             else:
-                data = r.json()
-                tav_results = data.get('results', [])
+                # Check if PDF
+                found_pdf = False
+                for res in tav_results:
+                    if res['url'].lower().endswith('.pdf'):
+                        status = "A (PDF Found)"
+                        note = res['url']
+                        results["A"] += 1
+                        found_pdf = True
+                        break
                 
-                if not tav_results:
-                    # Try broader search without filetype:pdf to see if HTML exists
-                    payload['query'] = f"site:.gov {kw} requirements"
-                    r2 = requests.post(tavily_url, json=payload, timeout=10)
-                    data2 = r2.json()
-                    if data2.get('results'):
-                        status = "B (HTML Found)"
-                        note = data2['results'][0]['url']
-                        results["B"] += 1
-                    else:
-                        status = "C (Nothing)"
-                        note = "No relevant gov results"
-                        results["C"] += 1
-                else:
-                    # Check if PDF
-                    found_pdf = False
-                    for res in tav_results:
-                        if res['url'].lower().endswith('.pdf'):
-                            status = "A (PDF Found)"
-                            note = res['url']
-                            results["A"] += 1
-                            found_pdf = True
-                            break
-                    
-                    if not found_pdf:
-                         status = "B (HTML Found)" # Found results but not PDF
-                         note = tav_results[0]['url']
-                         results["B"] += 1
+                if not found_pdf:
+                     status = "B (HTML Found)" # Found results but not PDF
+                     note = tav_results[0]['url']
+                     results["B"] += 1
 
+        except TavilyError as e:
+            status = "D (API Error)"
+            note = f"Status {e.status_code}"
+            results["D"] += 1
         except Exception as e:
             status = "D (Exception)"
             note = str(e)
@@ -138,6 +130,7 @@ def main():
     print(f"B (HTML Found - Logic Too Strict):     {results['B']}")
     print(f"C (Ghost - Invalid Keyword):           {results['C']}")
     print(f"D (API/System Error):                  {results['D']}")
+    print(f"Search cache: {tavily.cache_summary()}")
 
 if __name__ == "__main__":
     main()
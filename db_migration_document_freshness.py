@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Add parent directory to path so we can import matrix_config if run from root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from matrix_config import config
+from supabase import create_client, Client
+
+SUPABASE_URL = config.supabase_url
+SUPABASE_KEY = config.supabase_key
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("Error: Missing Supabase credentials.")
+    exit(1)
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Refresh mode (matrix_librarian.py --refresh): validators and last check per source URL,
+# so a freshness sweep can send conditional GETs and mostly get 304s back.
+# Existing rows count as checked when they were fetched.
+MIGRATION_SQL = """
+ALTER TABLE document_urls ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE document_urls ADD COLUMN IF NOT EXISTS last_modified TEXT;
+ALTER TABLE document_urls ADD COLUMN IF NOT EXISTS checked_at TIMESTAMPTZ;
+UPDATE document_urls SET checked_at = fetched_at WHERE checked_at IS NULL;
+CREATE INDEX IF NOT EXISTS document_urls_checked_at_idx ON document_urls (checked_at);
+"""
+
+def run_migration():
+    print("Adding etag / last_modified / checked_at to document_urls...")
+
+    try:
+        # Same approach as db_migration_file_type.py: try the exec_sql RPC helper first
+        response = supabase.rpc("exec_sql", {"sql": MIGRATION_SQL}).execute()
+        print(f"Migration via RPC success: {response}")
+    except Exception as e:
+        print(f"RPC migration failed: {e}")
+        print("\n\nIMPORTANT: Please run the following SQL in your Supabase SQL Editor:")
+        print(MIGRATION_SQL)
+
+if __name__ == "__main__":
+    run_migration()
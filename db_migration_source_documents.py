@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Add parent directory to path so we can import matrix_config if run from root
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from matrix_config import config
+from supabase import create_client, Client
+
+SUPABASE_URL = config.supabase_url
+SUPABASE_KEY = config.supabase_key
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("Error: Missing Supabase credentials.")
+    exit(1)
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Content-addressed document store:
+# - source_documents: one row per unique document (SHA-256), its storage object and reusable refine result
+# - document_urls: every source URL we have downloaded -> the document it resolved to
+# - grich_keywords_pool.doc_hash: per-keyword pointer
+MIGRATION_SQL = """
+CREATE TABLE IF NOT EXISTS source_documents (
+    doc_hash TEXT PRIMARY KEY,
+    storage_path TEXT,
+    file_type TEXT DEFAULT 'pdf',
+    size_bytes BIGINT,
+    content_json JSONB,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS document_urls (
+    url TEXT PRIMARY KEY,
+    doc_hash TEXT REFERENCES source_documents(doc_hash),
+    fetched_at TIMESTAMPTZ DEFAULT now()
+);
+ALTER TABLE grich_keywords_pool ADD COLUMN IF NOT EXISTS doc_hash TEXT;
+CREATE INDEX IF NOT EXISTS grich_keywords_pool_doc_hash_idx ON grich_keywords_pool (doc_hash);
+"""
+
+def run_migration():
+    print("Creating source_documents / document_urls and adding grich_keywords_pool.doc_hash...")
+
+    try:
+        # Same approach as db_migration_file_type.py: try the exec_sql RPC helper first
+        response = supabase.rpc("exec_sql", {"sql": MIGRATION_SQL}).execute()
+        print(f"Migration via RPC success: {response}")
+    except Exception as e:
+        print(f"RPC migration failed: {e}")
+        print("\n\nIMPORTANT: Please run the following SQL in your Supabase SQL Editor:")
+        print(MIGRATION_SQL)
+
+if __name__ == "__main__":
+    run_migration()
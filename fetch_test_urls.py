@@ -1,8 +1,8 @@
 import os
 import random
-import requests
 import urllib3
 from dotenv import load_dotenv
+from matrix_tavily import TavilyClient
 
 # Disable warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,21 +39,17 @@ def load_config():
         
     return config
 
-def search_gov_html(keyword, api_key):
+def search_gov_html(keyword, tavily):
     # Explicitly exclude PDF filetype in query
     query = f"site:.gov -filetype:pdf {keyword} requirements license reciprocity"
-    url = "https://api.tavily.com/search"
-    payload = {
-        "api_key": api_key,
-        "query": query,
-        "max_results": 5, # Fetch more results to filter manually if needed
-        "search_depth": "advanced",
-        "include_domains": [".gov"],
-        "exclude_domains": [] 
-    }
     try:
-        res = requests.post(url, json=payload, timeout=15)
-        data = res.json()
+        data = tavily.search(
+            query,
+            max_results=5, # Fetch more results to filter manually if needed
+            search_depth="advanced",
+            include_domains=[".gov"],
+            exclude_domains=[]
+        )
         if 'results' in data:
             for result in data['results']:
                 url = result['url']
@@ -68,6 +64,7 @@ if __name__ == "__main__":
     try:
         config = load_config()
         print("Tavily Key Loaded.")
+        tavily = TavilyClient([config['tavily_key']])
         
         seeds = [
             "Nurse license reciprocity California",
@@ -82,7 +79,7 @@ if __name__ == "__main__":
         found_urls = []
         for seed in seeds:
             print(f"Searching for: {seed}...")
-            url = search_gov_html(seed, config['tavily_key'])
+            url = search_gov_html(seed, tavily)
             if url:
                 print(f"   -> Found: {url}")
                 found_urls.append(url)
@@ -92,6 +89,7 @@ if __name__ == "__main__":
         print("\n=== Results ===")
         for i, u in enumerate(found_urls):
             print(f"{i+1}. {u}")
+        print(f"\nSearch cache: {tavily.cache_summary()}")
             
     except Exception as e:
         print(f"Error: {e}")
@@ -4,11 +4,14 @@ import sys
 import time
 import codecs
 import datetime
+import numpy as np
 import pandas as pd
 from supabase import create_client, Client
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from matrix_seen import SeenSlugFilter, slug_hash
+from matrix_classify import CLASSIFIER, UNCATEGORIZED
 
 # --- Configuration ---
 # GSC API Config
@@ -20,12 +23,66 @@ GSC_API_RETRIES = 3
 # Supabase Config
 TOKEN_FILE = os.path.join(".agent", "Token..txt")
 DB_TABLE = "grich_keywords_pool"
+INSERT_CHUNK = 500  # Rows per insert call
 
 # --- Helper Functions ---
 def make_slug(text):
     """Creates a URL-friendly slug from a text string."""
     return text.lower().replace(" ", "-").replace("/", "-").replace("--", "-").replace("?", "").replace(":", "")
 
+def make_slugs(queries):
+    """Vectorized make_slug over a pandas Series (same replacements, same order)."""
+    return queries.str.lower()\
+        .str.replace(" ", "-", regex=False)\
+        .str.replace("/", "-", regex=False)\
+        .str.replace("--", "-", regex=False)\
+        .str.replace("?", "", regex=False)\
+        .str.replace(":", "", regex=False)
+
+def prepare_new_keywords(potential_df, existing_slugs):
+    """
+    GSC rows -> DataFrame of insertable keyword rows.
+    Slugs, state/category tags and the dedupe against the DB all run column-wise:
+    known slugs are removed with an anti-join on the 64-bit slug hash.
+    """
+    df = pd.DataFrame({"keyword": potential_df["query"].astype(str).values})
+    df["slug"] = make_slugs(df["keyword"])
+    df = df.drop_duplicates("slug")  # Avoid duplicates within the same run
+    # blake2b has no column-wise form: the hashes are computed per slug, straight into the uint64 column
+    df["slug_hash"] = np.fromiter((slug_hash(s) for s in df["slug"]), dtype=np.uint64, count=len(df))
+
+    known = pd.DataFrame({"slug_hash": np.frombuffer(existing_slugs.hashes, dtype=np.uint64)})
+    df = df.merge(known, on="slug_hash", how="left", indicator=True)
+    df = df[df["_merge"] == "left_only"].drop(columns=["_merge", "slug_hash"])
+    if df.empty:
+        return df
+
+    tags = pd.DataFrame(CLASSIFIER.classify_batch(df["keyword"].tolist()),
+                        columns=["state", "category", "color_tag"], index=df.index)
+    df["state"] = tags["state"].fillna("Unknown")
+    # Same fallback as the scout's inherit_dye, so a keyword gets the same tag from either tool
+    uncategorized = tags["category"].isna()
+    df["category"] = tags["category"].mask(uncategorized, UNCATEGORIZED[0])
+    df["color_tag"] = tags["color_tag"].mask(uncategorized, UNCATEGORIZED[1])
+    df["is_downloaded"] = False
+    df["is_refined"] = False
+    return df
+
+def insert_in_chunks(supabase, df, chunk_size=INSERT_CHUNK):
+    """Bulk insert in sized chunks; returns (inserted, failed) row counts."""
+    records = df.astype(object).to_dict("records")
+    inserted, failed = 0, 0
+    for i in range(0, len(records), chunk_size):
+        chunk = records[i:i + chunk_size]
+        try:
+            res = supabase.table(DB_TABLE).insert(chunk).execute()
+            inserted += len(res.data)
+            print(f"  - Inserted chunk {i // chunk_size + 1}: {len(res.data)} rows")
+        except Exception as e:
+            failed += len(chunk)
+            print(f"❌ ERROR: Insert of chunk {i // chunk_size + 1} ({len(chunk)} rows) failed: {e}")
+    return inserted, failed
+
 # --- Main Logic ---
 def main():
     """
@@ -106,14 +163,9 @@ def main():
         print(f"❌ ERROR: Could not create Supabase client: {e}")
         sys.exit(1)
 
-    existing_slugs = set()
     try:
-        page, page_size = 0, 1000
-        while True:
-            res = supabase.table(DB_TABLE).select("slug").range(page * page_size, (page + 1) * page_size - 1).execute()
-            if not res.data: break
-            for row in res.data: existing_slugs.add(row['slug'])
-            page += 1
+        # Local seen-slug copy + only rows added since the last run (no full table scan)
+        existing_slugs = SeenSlugFilter.open(supabase, table=DB_TABLE)
         print(f"  - Found {len(existing_slugs)} existing slugs in the database.")
     except Exception as e:
         print(f"❌ ERROR: Failed to query existing slugs: {e}")
@@ -121,25 +173,16 @@ def main():
 
     # 3. Filter, prepare, and insert new keywords
     print("\nSTEP 3: Preparing and inserting new unique keywords...")
-    data_to_insert = []
-    for query in potential_df['query']:
-        slug = make_slug(query)
-        if slug not in existing_slugs:
-            data_to_insert.append({
-                "slug": slug, "is_downloaded": False, "is_refined": False, "color_tag": "Blue",
-            })
-            existing_slugs.add(slug) # Add to set to avoid duplicates within the same run
-
-    if not data_to_insert:
+    new_df = prepare_new_keywords(potential_df, existing_slugs)
+
+    if new_df.empty:
         print("✅ INFO: All high-potential keywords from GSC are already in the database. Nothing to do.")
         return
 
-    try:
-        res = supabase.table(DB_TABLE).insert(data_to_insert).execute()
-        inserted_count = len(res.data)
-        print(f"🚀 SUCCESS: Injected {inserted_count} new keywords into the '{DB_TABLE}' table!")
-    except Exception as e:
-        print(f"❌ ERROR: Database insert failed: {e}")
+    inserted_count, failed_count = insert_in_chunks(supabase, new_df)
+    print(f"🚀 SUCCESS: Injected {inserted_count} new keywords into the '{DB_TABLE}' table!")
+    if failed_count:
+        print(f"❌ ERROR: {failed_count} keywords failed to insert.")
         sys.exit(1)
 
 if __name__ == "__main__":
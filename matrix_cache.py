@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+# ================= Local Persistent Cache =================
+# Shared on-disk cache (SQLite) for anything we pay network time for:
+# autocomplete suggestions, search results, extracted PDF text, ...
+CACHE_DIR = os.environ.get("MATRIX_CACHE_DIR", ".cache")
+
+def normalize_query(text):
+    """Cache key normalization: lowercase, trimmed, single spaces"""
+    return re.sub(r"\s+", " ", str(text).lower()).strip()
+
+class TTLCache:
+    """
+    Key -> JSON value store with a fetch timestamp per entry.
+    Entries older than `ttl` seconds count as misses (ttl <= 0 disables expiry).
+    Safe to share between threads; WAL mode lets several processes share a file.
+    `get` returns None on a miss, so None itself is never cached.
+    """
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value, fetched_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl > 0 and time.time() - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        if value is None:
+            return
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, fetched_at) VALUES (?, ?, ?)",
+                (key, data, time.time())
+            )
+            self.conn.commit()
+
+    def purge_expired(self):
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            cur = self.conn.execute("DELETE FROM cache WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self.conn.commit()
+        return cur.rowcount
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return f"{self.hits} hits / {self.misses} misses ({self.hit_rate:.1%} hit rate)"
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class SizeLRUCache:
+    """
+    Key -> text store bounded by total size instead of age: once the stored
+    values exceed `max_bytes` the least recently read entries are evicted.
+    Same threading / multi-process behaviour and counters as TTLCache.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, used_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_used_at ON cache (used_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return row[0]
+
+    def set(self, key, value):
+        if value is None:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM cache ORDER BY used_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            self.evicted += 1
+
+    def size(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return (f"{self.hits} hits / {self.misses} misses ({self.hit_rate:.1%} hit rate), "
+                f"{self.size() / 1e6:.1f}/{self.max_bytes / 1e6:.0f} MB, {self.evicted} evicted")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,96 @@
+import re
+
+# ================= Keyword Classification =================
+# State / category tagging shared by the scout and gsc_miner, kept free of the
+# scout's crawl machinery so either can import it cheaply.
+
+# V42.4 Dyeing Protocol
+DYE_MAP = [
+    (r"lawyer|attorney|bar\s?exam|legal|juris", "Law", "Blue"),
+    (r"nurse|doctor|medical|clinic|rn|lpn|physician|health|surgery", "Medical", "Green"),
+    (r"accountant|cpa|finance|audit|tax|acc", "Finance", "Black"),
+    (r"teacher|education|school|pedagog|tutor|tefl", "Education", "Orange"),
+    (r"real\s?estate|realtor|broker|property", "RealEstate", "Red"),
+    (r"engineer|architect|civil|structur|mechanic", "Engineer", "Cyan"),
+    (r"electrician|hvac|plumb|welder|construct|wireman|journeyman", "Trades", "Yellow")
+]
+UNCATEGORIZED = ("Uncategorized", "Gray")   # (category, color) when nothing matches
+
+STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
+    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
+    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "dc": "DC", "district of columbia": "DC"
+}
+
+class KeywordClassifier:
+    """
+    Single-pass state + category tagger compiled once from STATES and DYE_MAP.
+    One lookahead regex is scanned over the text, so every position reports the
+    state name or dye pattern starting there. Priority matches the old loops:
+    the earliest STATES entry / DYE_MAP pattern found anywhere in the text wins.
+    """
+    SEP = "\x00"  # Batch separator: never inside a keyword, and \s / \w don't match it
+
+    def __init__(self, states=STATES, dye_map=DYE_MAP):
+        self.state_codes = list(states.values())
+        self.state_rank = {name: i for i, name in enumerate(states)}
+        self.dyes = [(category, color) for _, category, color in dye_map]
+
+        state_alt = "|".join(re.escape(name) for name in states)
+        dye_alt = "|".join(f"(?P<d{i}>{pattern})" for i, (pattern, _, _) in enumerate(dye_map))
+        self.matcher = re.compile(rf"(?=\b(?P<st>{state_alt})\b|{dye_alt})")
+        # A state name wins its position in the alternation; re-check dyes there
+        self.dye_matcher = re.compile(dye_alt)
+
+    def _scan(self, text):
+        """Yield (position, state_rank, dye_rank) for every hit in text."""
+        for m in self.matcher.finditer(text):
+            name = m.group("st")
+            if name is None:
+                yield m.start(), None, int(m.lastgroup[1:])
+                continue
+            dm = self.dye_matcher.match(text, m.start())
+            yield m.start(), self.state_rank[name], int(dm.lastgroup[1:]) if dm else None
+
+    def _resolve(self, state_rank, dye_rank):
+        state = self.state_codes[state_rank] if state_rank is not None else None
+        category, color = self.dyes[dye_rank] if dye_rank is not None else (None, None)
+        return state, category, color
+
+    def classify(self, text):
+        """Return (state_code, category, color); None for parts with no match."""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts):
+        """Classify a whole suggestion list with one scan over the joined text."""
+        texts = [t.lower() for t in texts]
+        ranks = [[None, None] for _ in texts]
+        if not texts:
+            return []
+        # End offset (exclusive) of every text inside the joined string
+        ends = []
+        offset = -1
+        for t in texts:
+            offset += len(t) + 1
+            ends.append(offset)
+
+        idx = 0
+        for pos, st, dy in self._scan(self.SEP.join(texts)):
+            while pos >= ends[idx]:
+                idx += 1
+            best = ranks[idx]
+            if st is not None and (best[0] is None or st < best[0]):
+                best[0] = st
+            if dy is not None and (best[1] is None or dy < best[1]):
+                best[1] = dy
+        return [self._resolve(st, dy) for st, dy in ranks]
+
+CLASSIFIER = KeywordClassifier()
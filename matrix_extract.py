@@ -0,0 +1,422 @@
+import io
+import os
+import time
+import queue
+import threading
+import collections
+import unicodedata
+import multiprocessing
+import pdfplumber
+from PyPDF2 import PdfReader
+
+# ================= PDF Extraction Engine =================
+# Fans the pages of a document out across worker processes in page ranges,
+# pulls each page's text with the cheapest tier that gives usable text,
+# reassembles them in page order and applies the refiner's selection rule
+# (first LEAD_PAGES pages + any page mentioning a high-value keyword).
+# One supervised pool is shared by every document in flight, so EXTRACT_WORKERS
+# is the global cap no matter how many documents are being extracted at once.
+HIGH_VALUE_KEYWORDS = ["fee", "cost", "price", "requirement", "checklist", "application", "process", "reciprocity", "endorsement", "exam", "grade"]
+LEAD_PAGES = 3
+MAX_PAGES = 50   # LIMIT PAGES to avoid huge processing
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 1))
+PAGES_PER_TASK = int(os.environ.get("EXTRACT_PAGES_PER_TASK", 4))
+# Tiered extraction: PyPDF2's raw text layer first, pdfplumber's layout analysis
+# only for pages where that text looks unusable
+FAST_PATH = os.environ.get("EXTRACT_FAST_PATH", "1").lower() not in ("0", "false", "no")
+FAST_MIN_CHARS = 200       # Fewer characters: sparse / scanned / oddly encoded page
+FAST_MAX_GARBAGE = 0.05    # Share of replacement, control or private-use characters
+FAST_MAX_LINE = 400        # Longer lines: table cells run together, needs layout
+# Deadlines: pdfplumber has no timeout of its own (<= 0 disables the document deadline)
+PAGE_TIMEOUT = float(os.environ.get("EXTRACT_PAGE_TIMEOUT", 30))
+DOC_TIMEOUT = float(os.environ.get("EXTRACT_DOC_TIMEOUT", 180))
+# Bump whenever a change here alters the text produced for the same PDF:
+# it is part of the extraction cache key, so old entries simply stop matching
+EXTRACTOR_VERSION = 3
+WORKER_RETRIES = 1   # A range whose worker died before starting a page is run again this many times
+RESULT_GRACE = 30    # Seconds result() waits past DOC_TIMEOUT before giving up on the supervisor
+
+class ExtractionError(RuntimeError):
+    """The engine could not extract a document (its supervisor failed or it was shut down)"""
+
+def _open(source):
+    """A source is a file path or the PDF's bytes (kept in memory, wrapped per reader)"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def _fast_reader(source):
+    try:
+        return PdfReader(_open(source))
+    except Exception:
+        return None   # PyPDF2 is stricter than pdfplumber on malformed files
+
+def page_count(source):
+    reader = _fast_reader(source)
+    if reader is not None:
+        return len(reader.pages)
+    with pdfplumber.open(_open(source)) as pdf:
+        return len(pdf.pages)
+
+def fast_text_usable(text):
+    """Score a PyPDF2 page: enough characters, little garbage, no run-together table rows"""
+    stripped = text.strip()
+    if len(stripped) < FAST_MIN_CHARS:
+        return False
+    garbage = stripped.count("(cid:")
+    for ch in stripped:
+        if ch == "\ufffd" or (not ch.isprintable() and ch not in "\n\t") or unicodedata.category(ch) == "Co":
+            garbage += 1
+    if garbage / len(stripped) > FAST_MAX_GARBAGE:
+        return False
+    return max(len(line) for line in stripped.splitlines()) <= FAST_MAX_LINE
+
+def iter_pages(source, first, last, fast_path=FAST_PATH, on_start=None):
+    """Yield one dict per page first..last-1 with text, tier used, seconds and error"""
+    reader = _fast_reader(source) if fast_path else None
+    plumber = None
+    try:
+        for i in range(first, last):
+            if on_start is not None:
+                on_start(i)
+            started = time.perf_counter()
+            page = {"index": i, "text": "", "tier": None, "error": None}
+            if reader is not None:
+                try:
+                    text = reader.pages[i].extract_text() or ""
+                    if fast_text_usable(text):
+                        page.update(text=text, tier="pypdf")
+                except Exception:
+                    pass   # Let pdfplumber have a go
+            if page["tier"] is None:
+                try:
+                    if plumber is None:
+                        plumber = pdfplumber.open(_open(source))
+                    # Sometimes extract_text hangs on complex layout (the supervisor's page deadline covers it)
+                    page.update(text=plumber.pages[i].extract_text() or "", tier="pdfplumber")
+                except Exception as e:
+                    page["error"] = str(e)
+            page["seconds"] = time.perf_counter() - started
+            yield page
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+def extract_page_range(source, first, last, fast_path=FAST_PATH):
+    """In-process extraction of a page range (no deadlines)"""
+    return list(iter_pages(source, first, last, fast_path))
+
+def _worker_main(tasks, results):
+    """Worker process: announces each page before extracting it, so the supervisor knows what is stuck"""
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, source, first, last, fast_path = task
+        try:
+            for page in iter_pages(source, first, last, fast_path,
+                                   on_start=lambda i: results.put(("start", task_id, i))):
+                results.put(("page", task_id, page))
+        except Exception as e:
+            results.put(("error", task_id, str(e)))
+        results.put(("done", task_id, None))
+
+def select_high_value(pages, keywords=HIGH_VALUE_KEYWORDS, lead_pages=LEAD_PAGES):
+    """Selection rule over (index, text) in page order. Returns (text, pages kept)."""
+    extracted_text = ""
+    read_pages = 0
+    for i, text in sorted(pages):
+        text_lower = text.lower()
+        if i < lead_pages or any(k in text_lower for k in keywords):
+            extracted_text += f"\n--- Page {i+1} ---\n{text}"
+            read_pages += 1
+    return extracted_text, read_pages
+
+def extraction_cache_key(doc_hash, max_pages=MAX_PAGES, fast_path=FAST_PATH,
+                         keywords=HIGH_VALUE_KEYWORDS, lead_pages=LEAD_PAGES):
+    """(document SHA-256, extractor version, page-selection params) as one cache key"""
+    return f"{doc_hash}|v{EXTRACTOR_VERSION}|{max_pages}|{int(fast_path)}|{lead_pages}|{','.join(keywords)}"
+
+class ExtractionJob:
+    """Pages of one document as they arrive from the workers; result() waits and reassembles them"""
+    def __init__(self, total_pages, max_pages, doc_timeout):
+        self.total_pages = total_pages
+        self.max_pages = max_pages
+        self.expected = min(total_pages, max_pages)
+        self.doc_timeout = doc_timeout
+        self.pages = {}
+        self.timed_out = []
+        self.deadline_hit = False
+        self.submitted = time.time()
+        self.started = None          # First page handed to a worker (queue time doesn't count)
+        self.error = None
+        self.done = threading.Event()
+        if self.expected == 0:
+            self.done.set()
+
+    @property
+    def finished(self):
+        return self.done.is_set()
+
+    def _check_complete(self):
+        if len(self.pages) + len(self.timed_out) >= self.expected:
+            self.done.set()
+
+    def add_page(self, page):
+        if not self.finished:
+            self.pages[page["index"]] = page
+            self._check_complete()
+
+    def add_timeout(self, index):
+        if not self.finished and index not in self.pages:
+            self.timed_out.append(index)
+            self._check_complete()
+
+    def expire(self):
+        self.deadline_hit = True
+        self.done.set()
+
+    def fail(self, error):
+        self.error = error
+        self.done.set()
+
+    def _overdue(self):
+        return self.doc_timeout > 0 and self.started is not None and \
+            time.monotonic() - self.started > self.doc_timeout + RESULT_GRACE
+
+    def result(self, timeout=None):
+        """
+        Wait for the pages and reassemble them. Without `timeout` this still gives up
+        RESULT_GRACE after the document deadline, in case the supervisor stopped enforcing it.
+        Raises ExtractionError if the engine failed.
+        """
+        if timeout is not None:
+            self.done.wait(timeout)
+        else:
+            while not self.done.wait(0.5) and not self._overdue():
+                pass
+        if not self.finished:
+            self.expire()
+        if self.error:
+            raise ExtractionError(self.error)
+        pages = [self.pages[i] for i in sorted(self.pages)]
+        text, read_pages = select_high_value([(p["index"], p["text"]) for p in pages])
+        tiers = {}
+        for p in pages:
+            if p["tier"]:
+                tiers[p["tier"]] = tiers.get(p["tier"], 0) + 1
+        missing = sorted(set(range(self.expected)) - set(self.pages))
+        return {
+            "text": text,
+            "total_pages": self.total_pages,
+            "scanned_pages": len(pages),
+            "read_pages": read_pages,
+            "errors": [(p["index"], p["error"]) for p in pages if p["error"]],
+            "tiers": tiers,
+            "page_stats": [{"page": p["index"] + 1, "tier": p["tier"], "seconds": round(p["seconds"], 4)} for p in pages],
+            "truncated": self.total_pages > self.max_pages,
+            # Partial text: some pages hit the page deadline or the document deadline cut the rest
+            "extraction_timeout": bool(missing),
+            "missing_pages": [i + 1 for i in missing],
+            "deadline_hit": self.deadline_hit,
+            "seconds": time.time() - self.submitted,
+        }
+
+class _Worker:
+    def __init__(self, ctx, results):
+        self.tasks = ctx.Queue()
+        self.process = ctx.Process(target=_worker_main, args=(self.tasks, results), daemon=True)
+        self.process.start()
+        self.task_id = None
+        self.page = None
+        self.page_started = None
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.tasks.close()
+
+class ExtractionEngine:
+    """
+    Supervised worker processes (spawned, so it behaves the same on Windows).
+    A worker stuck on one page past PAGE_TIMEOUT is killed and replaced; the
+    page is marked missing and the rest of its range goes back in the queue.
+    A document still running DOC_TIMEOUT after its first page started is cut
+    off with whatever pages arrived. Either way the result carries
+    extraction_timeout=True and the missing page numbers. If the supervisor
+    itself fails, every open job raises ExtractionError instead of waiting.
+    """
+    def __init__(self, max_workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK, fast_path=FAST_PATH,
+                 page_timeout=PAGE_TIMEOUT, doc_timeout=DOC_TIMEOUT):
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.fast_path = fast_path
+        self.page_timeout = page_timeout
+        self.doc_timeout = doc_timeout
+        self.recycled = 0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._workers = [_Worker(self._ctx, self._results) for _ in range(self.max_workers)]
+        self._pending = collections.deque()    # (job, source, first, last, attempt)
+        self._tasks = {}                       # task_id -> (worker, job, source, first, last, attempt)
+        self._jobs = []
+        self._next_task = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.error = None
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+
+    def submit(self, source, max_pages=MAX_PAGES):
+        """
+        Start extracting a document (file path or bytes); returns an ExtractionJob
+        (raises if the PDF can't be opened). Bytes are sent to the workers with each
+        page range, so very large documents are better passed as a path.
+        """
+        total = page_count(source)
+        job = ExtractionJob(total, max_pages, self.doc_timeout)
+        with self._lock:
+            if self._closed:
+                raise ExtractionError(self.error or "extraction engine is shut down")
+            for first in range(0, job.expected, self.pages_per_task):
+                self._pending.append((job, source, first, min(first + self.pages_per_task, job.expected), 0))
+            if not job.finished:
+                self._jobs.append(job)
+        return job
+
+    def extract(self, source, max_pages=MAX_PAGES):
+        return self.submit(source, max_pages).result()
+
+    # ---- supervisor (runs in its own thread, everything under self._lock) ----
+    def _supervise(self):
+        try:
+            while not self._closed:
+                messages = []
+                try:
+                    messages.append(self._results.get(timeout=0.05))
+                    # Drain everything queued, so a dead worker's last pages are in before its deadline check
+                    while True:
+                        messages.append(self._results.get_nowait())
+                except queue.Empty:
+                    pass
+                with self._lock:
+                    for message in messages:
+                        self._handle(*message)
+                    self._check_deadlines()
+                    self._dispatch()
+        except Exception as e:
+            # Nobody would enforce deadlines or deliver pages any more: fail every open job now
+            self._fail(f"extraction supervisor failed: {e!r}")
+
+    def _fail(self, error):
+        with self._lock:
+            self._closed = True
+            self.error = error
+            jobs = set(self._jobs) | {t[0] for t in self._pending} | {t[1] for t in self._tasks.values()}
+            self._jobs, self._pending, self._tasks = [], collections.deque(), {}
+        for job in jobs:
+            job.fail(error)
+
+    def _dispatch(self):
+        for worker in self._workers:
+            while worker.task_id is None and self._pending:
+                job, source, first, last, attempt = self._pending.popleft()
+                if job.finished:
+                    continue
+                task_id = self._next_task
+                self._next_task += 1
+                self._tasks[task_id] = (worker, job, source, first, last, attempt)
+                worker.task_id = task_id
+                # Page clock runs from dispatch: a worker stuck opening the PDF is caught too
+                worker.page, worker.page_started = None, time.monotonic()
+                if job.started is None:
+                    job.started = time.monotonic()
+                worker.tasks.put((task_id, source, first, last, self.fast_path))
+
+    def _handle(self, kind, task_id, payload):
+        if task_id not in self._tasks:
+            return   # Stale message from a worker we already killed
+        worker, job, _, first, last, _ = self._tasks[task_id]
+        if kind == "start":
+            worker.page, worker.page_started = payload, time.monotonic()
+        elif kind == "page":
+            worker.page_started = time.monotonic()   # Until the next page starts or the range is done
+            job.add_page(payload)
+        elif kind == "error":
+            # The range failed outside the per-page handling: its remaining pages are errors, not hangs
+            self._fail_range(job, first, last, payload)
+        elif kind == "done":
+            del self._tasks[task_id]
+            worker.task_id = worker.page = worker.page_started = None
+
+    @staticmethod
+    def _fail_range(job, first, last, error):
+        for i in range(first, last):
+            if i not in job.pages:
+                job.add_page({"index": i, "text": "", "tier": None, "error": error, "seconds": 0.0})
+
+    def _recycle(self, worker, requeue_from=None, attempt=0):
+        """Kill a worker, hand the rest of its range back to the queue, start a fresh one"""
+        task = self._tasks.pop(worker.task_id, None) if worker.task_id is not None else None
+        if task is not None and requeue_from is not None:
+            _, job, source, _, last, _ = task
+            if requeue_from < last and not job.finished:
+                self._pending.appendleft((job, source, requeue_from, last, attempt))
+        worker.kill()
+        self._workers[self._workers.index(worker)] = _Worker(self._ctx, self._results)
+        self.recycled += 1
+
+    def _check_deadlines(self):
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if worker.task_id is None:
+                if not worker.process.is_alive():
+                    self._recycle(worker)   # Died while idle: replace it before it is handed a task
+                continue
+            _, job, _, first, last, attempt = self._tasks[worker.task_id]
+            stuck = worker.page_started is not None and now - worker.page_started > self.page_timeout
+            if not stuck and worker.process.is_alive():
+                continue
+            if worker.page is not None:
+                job.add_timeout(worker.page)   # No-op if that page had already arrived
+                self._recycle(worker, requeue_from=worker.page + 1)
+            elif attempt < WORKER_RETRIES:
+                # Died or stuck before starting its first page (e.g. opening the PDF): the whole range goes back
+                self._recycle(worker, requeue_from=first, attempt=attempt + 1)
+            else:
+                if stuck:
+                    for i in range(first, last):
+                        job.add_timeout(i)
+                else:
+                    self._fail_range(job, first, last, "extraction worker died")
+                self._recycle(worker)
+
+        for job in list(self._jobs):
+            if job.finished:
+                self._jobs.remove(job)
+            elif job.started is not None and self.doc_timeout > 0 and now - job.started > self.doc_timeout:
+                job.expire()
+                self._jobs.remove(job)
+                self._pending = collections.deque(t for t in self._pending if t[0] is not job)
+                for worker in list(self._workers):
+                    if worker.task_id is not None and self._tasks[worker.task_id][1] is job:
+                        self._recycle(worker)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def shutdown(self):
+        self._closed = True
+        self._supervisor.join(5)
+        if self.error is None:
+            self._fail("extraction engine is shut down")   # Jobs still open would wait forever
+        for worker in self._workers:
+            try:
+                worker.tasks.put(None)
+            except (ValueError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.kill()
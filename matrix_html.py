@@ -0,0 +1,70 @@
+import json
+import zlib
+import base64
+import hashlib
+from bs4 import BeautifulSoup
+
+# ================= HTML Source Compaction =================
+# HTML sources are stored inline in grich_keywords_pool.content_raw. Instead of
+# the whole page (scripts, navigation, ...) we keep only the main-content text,
+# zlib-compressed, inside a small JSON envelope that also records the original
+# page's size and SHA-256. Consumers read it back with html_text().
+CODEC = "zlib+b64"
+NOISE_TAGS = ["script", "style", "nav", "footer", "header", "noscript", "iframe", "svg", "template"]
+MAIN_SELECTORS = ["main", "article", "[role=main]", "#main-content", "#maincontent", "#content", ".main-content"]
+MIN_MAIN_CHARS = 200   # A "main" element with less text than this is probably a stub; use <body>
+
+def _clean_text(node):
+    text = node.get_text(separator="\n")
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def extract_main_text(html):
+    """Readable main-content text of a page (same cleanup as the old test_refiner_html prototype)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    for selector in MAIN_SELECTORS:
+        node = soup.select_one(selector)
+        if node is not None:
+            text = _clean_text(node)
+            if len(text) >= MIN_MAIN_CHARS:
+                return text
+    return _clean_text(soup.body or soup)
+
+def pack_html(html, raw_size=None, raw_sha256=None):
+    """content_raw value for an HTML page: compressed main text plus a record of the original"""
+    raw_bytes = html.encode("utf-8")
+    text = extract_main_text(html)
+    data = zlib.compress(text.encode("utf-8"), 9)
+    return json.dumps({
+        "codec": CODEC,
+        "raw_size": raw_size if raw_size is not None else len(raw_bytes),
+        "raw_sha256": raw_sha256 or hashlib.sha256(raw_bytes).hexdigest(),
+        "text_size": len(text),
+        "data": base64.b64encode(data).decode("ascii"),
+    }, separators=(",", ":"))
+
+def _envelope(content_raw):
+    if not content_raw or not content_raw.startswith('{"codec"'):
+        return None
+    try:
+        envelope = json.loads(content_raw)
+    except ValueError:
+        return None
+    return envelope if envelope.get("codec") == CODEC else None
+
+def html_text(content_raw):
+    """Text of a content_raw value; legacy rows holding the raw page are cleaned on the fly"""
+    envelope = _envelope(content_raw)
+    if envelope is None:
+        return extract_main_text(content_raw) if content_raw else ""
+    return zlib.decompress(base64.b64decode(envelope["data"])).decode("utf-8")
+
+def html_record(content_raw):
+    """Size / hash record of a packed value (None for legacy raw rows)"""
+    envelope = _envelope(content_raw)
+    if envelope is None:
+        return None
+    return {k: v for k, v in envelope.items() if k != "data"}
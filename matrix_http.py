@@ -0,0 +1,169 @@
+import os
+import threading
+import contextlib
+from urllib.parse import urlsplit
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# Disable insecure request warnings for government sites with SSL issues
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# ================= Shared HTTP Client =================
+# One keep-alive Session per client instead of a fresh TLS handshake per request,
+# a cap on requests in flight per host (many tasks hit the same slow state server),
+# and per-host timeouts that follow the latency we actually observe.
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 32))            # Hosts kept alive
+HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", 4))     # Connections kept alive per host
+PER_HOST_CONCURRENCY = int(os.environ.get("PER_HOST_CONCURRENCY", 2)) # Requests in flight per host; 0 = no cap
+TIMEOUT_MIN = float(os.environ.get("HTTP_TIMEOUT_MIN", 10))   # Per socket read, not per download
+TIMEOUT_MAX = float(os.environ.get("HTTP_TIMEOUT_MAX", 120))
+TIMEOUT_FACTOR = 4.0     # Timeout = factor x smoothed latency ...
+MIN_SAMPLES = 3          # ... once a host has answered this many times
+EWMA_ALPHA = 0.3
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+class HostStats:
+    """Latency / outcome history and the concurrency slot for one host"""
+    def __init__(self, concurrency):
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self.latency = None      # Smoothed seconds to response headers
+        self.samples = 0
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def observe(self, seconds):
+        self.latency = seconds if self.latency is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency
+        self.samples += 1
+
+    def timeout(self, default):
+        if self.samples < MIN_SAMPLES:
+            return default
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, TIMEOUT_FACTOR * self.latency))
+
+class HttpClient:
+    """
+    Thread-safe wrapper around a pooled requests.Session.
+    `verify` is the default TLS verification (False keeps working with the
+    broken certificates of CDPH and other gov sites); callers can override it.
+    A timeout passed by the caller is the starting value; once a host has
+    MIN_SAMPLES answers its timeout is derived from its smoothed latency, and
+    every timeout on that host doubles it (bounded by TIMEOUT_MIN/TIMEOUT_MAX).
+    """
+    def __init__(self, verify=True, per_host=PER_HOST_CONCURRENCY, pool_size=HTTP_POOL_SIZE,
+                 pool_per_host=HTTP_POOL_PER_HOST, user_agent=USER_AGENT):
+        self.verify = verify
+        self.per_host = per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max(pool_per_host, per_host))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url):
+        name = host_of(url)
+        with self._lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostStats(self.per_host)
+            return self.hosts[name]
+
+    def timeout_for(self, url, default=30):
+        stats = self.host(url)
+        with self._lock:
+            return stats.timeout(default)
+
+    def _record(self, stats, timeout, response=None, error=None):
+        with self._lock:
+            stats.requests += 1
+            if response is not None:
+                stats.observe(response.elapsed.total_seconds())
+            elif isinstance(error, requests.Timeout):
+                stats.errors += 1
+                stats.timeouts += 1
+                # Next request to this host waits twice as long as this one did
+                stats.latency = min(TIMEOUT_MAX, 2 * timeout) / TIMEOUT_FACTOR
+                stats.samples = max(stats.samples, MIN_SAMPLES)
+            else:
+                stats.errors += 1
+
+    @contextlib.contextmanager
+    def _slot(self, stats):
+        if stats.slots is None:
+            yield
+            return
+        with stats.slots:
+            yield
+
+    def _send(self, method, url, stats, timeout, **kwargs):
+        kwargs.setdefault("verify", self.verify)
+        with self._lock:
+            timeout = stats.timeout(timeout)
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+        except Exception as e:
+            self._record(stats, timeout, error=e)
+            raise
+        self._record(stats, timeout, response=response)
+        return response
+
+    def request(self, method, url, timeout=30, **kwargs):
+        """Plain (non-streamed) request; the host slot is held for the whole call."""
+        stats = self.host(url)
+        with self._slot(stats):
+            return self._send(method, url, stats, timeout, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    @contextlib.contextmanager
+    def stream(self, url, method="GET", timeout=30, **kwargs):
+        """Streamed request; the host slot is held until the body has been read and the response closed."""
+        stats = self.host(url)
+        with self._slot(stats):
+            response = self._send(method, url, stats, timeout, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "timeouts": s.timeouts,
+                    "latency_s": round(s.latency, 3) if s.latency is not None else None,
+                    "timeout_s": round(s.timeout(0), 1) if s.samples >= MIN_SAMPLES else None,
+                }
+                for name, s in self.hosts.items()
+            }
+
+    def summary(self, top=5):
+        busiest = sorted(self.stats().items(), key=lambda item: -item[1]["requests"])[:top]
+        return " | ".join(
+            f"{name}: {s['requests']} req, {s['errors']} err, latency {s['latency_s']}s" for name, s in busiest
+        ) or "no requests"
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(verify=True, per_host=PER_HOST_CONCURRENCY):
+    """Process-wide client per (TLS mode, host cap), so every caller shares the same keep-alive pools"""
+    with _clients_lock:
+        if (verify, per_host) not in _clients:
+            _clients[(verify, per_host)] = HttpClient(verify=verify, per_host=per_host)
+        return _clients[(verify, per_host)]
@@ -1,30 +1,174 @@
 import os
 import time
-import requests
+import io
+import hashlib
+import argparse
+import tempfile
+import threading
 import urllib3
-from datetime import datetime, timezone
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
 from supabase import create_client, Client
 from typing import List
+from matrix_tavily import TavilyClient
+from matrix_http import get_client
+from matrix_storage import (list_bucket_objects, reconcile, requeue_missing, doc_storage_path,
+                            STORAGE_BUCKET, DOC_PREFIX, DOCUMENTS_TABLE, DOCUMENT_URLS_TABLE)
+from matrix_html import pack_html
 
 # Disable insecure request warnings for government sites with SSL issues
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # ================= Configuration =================
 TOKEN_FILE = os.path.join(".agent", "Token..txt")  # Fallback for local development
-STORAGE_BUCKET = "raw-handbooks"
 # Priority: Env Var > Default
 BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 200))
+# Per-stage concurrency (1 / 1 / 1 = legacy sequential mode with 1s pause per task)
+SEARCH_CONCURRENCY = int(os.environ.get("SEARCH_CONCURRENCY", 1))
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", 1))
+DB_CONCURRENCY = int(os.environ.get("DB_CONCURRENCY", 1))
+# Speculative search: fire the PDF and HTML taps together instead of HTML only after a PDF miss
+SPECULATIVE_SEARCH = os.environ.get("SPECULATIVE_SEARCH", "").lower() in ("1", "true", "yes")
+# Download limits: abort anything bigger, keep small files in RAM, spill the rest to a temp file
+MAX_DOCUMENT_BYTES = int(float(os.environ.get("MAX_DOCUMENT_MB", 50)) * 1024 * 1024)
+MAX_HTML_BYTES = 5 * 1024 * 1024
+SPOOL_MEMORY_BYTES = int(float(os.environ.get("SPOOL_MEMORY_MB", 8)) * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+# Refresh mode: conditional re-fetch of stored source documents not checked for this long
+REFRESH_AFTER_DAYS = float(os.environ.get("REFRESH_AFTER_DAYS", 30))
+REFRESH_BATCH = int(os.environ.get("REFRESH_BATCH", 1000))
 
 # Environment variable names for cloud deployment
 ENV_SUPABASE_URL = "SUPABASE_URL"
 ENV_SUPABASE_KEY = "SUPABASE_KEY"
 ENV_TAVILY_KEY = "TAVILY_KEY"
 
-class MatrixLibrarian:
+class DocumentTooLarge(Exception):
+    pass
+
+def sniff_file_type(first_chunk):
+    """Decide from the bytes, not the Content-Type header: PDFs carry %PDF- in the first 1 KB."""
+    return 'pdf' if b"%PDF-" in first_chunk[:1024] else 'html'
+
+def response_validators(response):
+    """Cache validators for a later conditional GET (If-None-Match / If-Modified-Since)"""
+    return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+class SpooledDocument:
+    """
+    Bounded download buffer: bytes in memory up to SPOOL_MEMORY_BYTES, then a
+    private temp file. `payload()` is what storage upload accepts (bytes or an
+    open BufferedReader), so large documents are streamed, never held whole in RAM.
+    """
+    def __init__(self, memory_limit=SPOOL_MEMORY_BYTES):
+        self.memory_limit = memory_limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.buffer = io.BytesIO()
+        self.path = None
+        self._file = None
+        self._reader = None
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        self.sha256.update(chunk)
+        if self._file is None and self.size > self.memory_limit:
+            fd, self.path = tempfile.mkstemp(prefix="librarian_", suffix=".part")
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self.buffer.getvalue())
+            self.buffer = None
+        (self._file or self.buffer).write(chunk)
+
+    def getvalue(self):
+        """Whole document as bytes, read back from the temp file if it was spooled (callers bound the size)"""
+        if self._file is None:
+            return self.buffer.getvalue()
+        if not self._file.closed:
+            self._file.flush()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def payload(self):
+        if self._file is None:
+            return self.buffer.getvalue()
+        self._file.close()
+        self._reader = open(self.path, "rb")
+        return self._reader
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class TapCancel(threading.Event):
+    """Set once a PDF hit makes the speculative HTML tap moot; `skipped`: the tap saw it before calling Tavily"""
+    skipped = False
+
+class TapStats:
+    """
+    Per-category counts for the two search taps. `html_unused` are speculative
+    HTML searches that ran but lost to a PDF hit (credits spent for nothing);
+    `html_cancelled` were dropped before they started.
+    """
+    FIELDS = ("pdf_calls", "pdf_hits", "html_calls", "html_hits", "html_unused", "html_cancelled")
+
     def __init__(self):
+        self.counts = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self._lock = threading.Lock()
+
+    def record(self, category, field):
+        with self._lock:
+            self.counts[category or "Uncategorized"][field] += 1
+
+    def summary_lines(self):
+        with self._lock:
+            rows = sorted(self.counts.items())
+        for category, c in rows:
+            pdf_rate = c["pdf_hits"] / c["pdf_calls"] if c["pdf_calls"] else 0.0
+            html_rate = c["html_hits"] / c["html_calls"] if c["html_calls"] else 0.0
+            yield (f"{category}: PDF {c['pdf_hits']}/{c['pdf_calls']} ({pdf_rate:.0%}) | "
+                   f"HTML {c['html_hits']}/{c['html_calls']} ({html_rate:.0%}) | "
+                   f"speculative unused {c['html_unused']}, cancelled {c['html_cancelled']}")
+
+class MatrixLibrarian:
+    def __init__(self, search_concurrency=SEARCH_CONCURRENCY, download_concurrency=DOWNLOAD_CONCURRENCY,
+                 db_concurrency=DB_CONCURRENCY, use_search_cache=True, speculative=SPECULATIVE_SEARCH):
         self.config = self._load_config()
         self.supabase: Client = create_client(self.config['url'], self.config['key'])
-        # tavily_keys are managed in _load_config and get_tavily_key
+        # tavily_keys are loaded in _load_config; the key pool and the search cache live in TavilyClient
+        self.tavily_keys = self.config['tavily_keys']
+        self.tavily = TavilyClient(self.tavily_keys, use_cache=use_search_cache)
+        # verify=False is critical for CDPH and other gov sites
+        self.http = get_client(verify=False)
+        self.tap_stats = TapStats()
+        # Speculative mode: the HTML tap runs here while the task's own thread runs the PDF tap
+        self.speculative = speculative
+        self.tap_pool = ThreadPoolExecutor(max_workers=max(1, search_concurrency)) if speculative else None
+
+        # Stage slots: each task holds one only while it is in that stage (search slots are taken
+        # per Tavily call instead, so a speculative HTML tap counts too)
+        self.search_concurrency = max(1, search_concurrency)
+        self.download_concurrency = max(1, download_concurrency)
+        self.db_concurrency = max(1, db_concurrency)
+        self.search_slots = threading.BoundedSemaphore(self.search_concurrency)
+        self.download_slots = threading.BoundedSemaphore(self.download_concurrency)
+        self.db_slots = threading.BoundedSemaphore(self.db_concurrency)
+
+        # One download per URL at a time: concurrent tasks for the same handbook wait and reuse it
+        self._url_locks = {}
+        self._url_locks_guard = threading.Lock()
+
+        # Uploads of this run awaiting the batched bucket check: {storage path: (doc_hash, size)}
+        self.pending_uploads = {}
+        self._pending_lock = threading.Lock()
         
     def _load_config(self):
         config = {}
@@ -82,19 +226,9 @@ class MatrixLibrarian:
         if 'tavily_keys' not in config:
              raise ValueError("Critical: TAVILY_KEY is missing. Search cannot proceed.")
         
-        self.tavily_keys = config['tavily_keys']
-        self.current_tavily_idx = 0
-        
         print("⚠️  Config loaded from local Token file (development mode).")
         return config
 
-    def get_tavily_key(self):
-        return self.tavily_keys[self.current_tavily_idx % len(self.tavily_keys)]
-
-    def next_tavily_key(self):
-        self.current_tavily_idx += 1
-        print(f"   🔄 Switched to Tavily Key {self.current_tavily_idx % len(self.tavily_keys) + 1}")
-
     def fetch_pending_tasks(self) -> List[dict]:
         print(f"📋 Fetching batch of {BATCH_SIZE} tasks (Simple & Brutal)...")
         try:
@@ -113,102 +247,389 @@ class MatrixLibrarian:
             print(f"❌ Fetch Error: {e}")
             return []
 
-    def search_document(self, keyword):
-        # 1. First Tap: Search for PDF
+    def tavily_search(self, query, cancel=None):
+        """
+        One Tavily call under a search slot, so both speculative taps count against --search-concurrency.
+        Returns None without calling if `cancel` got set while waiting for the slot.
+        """
+        with self.search_slots:
+            if cancel is not None and cancel.is_set():
+                cancel.skipped = True
+                return None
+            return self.tavily.search(query, max_results=1, search_depth="advanced")
+
+    def search_pdf(self, keyword, category=None):
+        """First Tap: Search for PDF"""
         query_pdf = f"site:.gov filetype:pdf {keyword} report handbook"
-        url = "https://api.tavily.com/search"
-        payload_pdf = {
-            "api_key": self.get_tavily_key(),
-            "query": query_pdf,
-            "max_results": 1,
-            "search_depth": "advanced"
-        }
-        
+        self.tap_stats.record(category, "pdf_calls")
         try:
-            res = requests.post(url, json=payload_pdf, timeout=15)
-            if res.status_code == 429 or res.status_code == 401 or res.status_code == 403:
-                self.next_tavily_key()
-                payload_pdf["api_key"] = self.get_tavily_key()
-                res = requests.post(url, json=payload_pdf, timeout=15)
-                
-            data = res.json()
+            data = self.tavily_search(query_pdf)
             if 'results' in data and len(data['results']) > 0:
-                result = data['results'][0]
+                result = dict(data['results'][0])
                 result['file_type'] = 'pdf'
+                self.tap_stats.record(category, "pdf_hits")
                 return result
         except Exception as e:
             print(f"   ⚠️ PDF Search Error: {e}")
-            
-        # 2. Second Tap: Search for HTML if PDF not found
-        print(f"   🔄 PDF not found, performing Second Tap (HTML)...")
+        return None
+
+    def search_html(self, keyword, category=None, cancel=None):
+        """Second Tap: Search for HTML (`cancel`: speculative mode, set once a PDF hit makes it moot)"""
         query_html = f"site:.gov {keyword} requirements"
-        payload_html = {
-            "api_key": self.get_tavily_key(),
-            "query": query_html,
-            "max_results": 1,
-            "search_depth": "advanced"
-        }
-        
         try:
-            res = requests.post(url, json=payload_html, timeout=15)
-            if res.status_code == 429 or res.status_code == 401 or res.status_code == 403:
-                self.next_tavily_key()
-                payload_html["api_key"] = self.get_tavily_key()
-                res = requests.post(url, json=payload_html, timeout=15)
-                
-            data = res.json()
+            data = self.tavily_search(query_html, cancel)
+            if data is None:
+                self.tap_stats.record(category, "html_cancelled")
+                return None
+            self.tap_stats.record(category, "html_calls")
             if 'results' in data and len(data['results']) > 0:
-                result = data['results'][0]
+                result = dict(data['results'][0])
                 # Default to html if not explicitly ending in pdf
                 result['file_type'] = 'pdf' if result['url'].lower().endswith('.pdf') else 'html'
+                self.tap_stats.record(category, "html_hits")
                 return result
         except Exception as e:
+            self.tap_stats.record(category, "html_calls")
             print(f"   ⚠️ HTML Search Error: {e}")
-            
         return None
 
+    def search_document(self, keyword, category=None):
+        if self.speculative:
+            return self.search_document_speculative(keyword, category)
+
+        result = self.search_pdf(keyword, category)
+        if result:
+            return result
+        # Second Tap only if PDF not found
+        print(f"   🔄 PDF not found, performing Second Tap (HTML)...")
+        return self.search_html(keyword, category)
+
+    def search_document_speculative(self, keyword, category=None):
+        """Both taps at once; a PDF hit wins and the HTML call is cancelled or ignored."""
+        cancel = TapCancel()
+        html_future = self.tap_pool.submit(self.search_html, keyword, category, cancel)
+        result = self.search_pdf(keyword, category)
+        if result:
+            cancel.set()
+            if html_future.cancel():
+                self.tap_stats.record(category, "html_cancelled")
+            else:
+                # Still waiting for a search slot: the tap skips its call (and counts itself cancelled).
+                # Otherwise its call ran or is running: credits spent for nothing (its result still lands in the cache)
+                html_future.add_done_callback(
+                    lambda _: cancel.skipped or self.tap_stats.record(category, "html_unused"))
+            return result
+        print("   🔄 PDF not found, using speculative Second Tap (HTML)...")
+        return html_future.result()
+
+    def url_lock(self, url):
+        with self._url_locks_guard:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def find_document(self, url=None, doc_hash=None):
+        """Known document for a source URL or content hash (None if new or on lookup error)"""
+        try:
+            if doc_hash is None:
+                res = self.supabase.table(DOCUMENT_URLS_TABLE).select("doc_hash").eq("url", url).limit(1).execute()
+                if not res.data:
+                    return None
+                doc_hash = res.data[0]["doc_hash"]
+            res = self.supabase.table(DOCUMENTS_TABLE)\
+                .select("doc_hash, storage_path, file_type, size_bytes")\
+                .eq("doc_hash", doc_hash)\
+                .limit(1)\
+                .execute()
+            return res.data[0] if res.data else None
+        except Exception as e:
+            print(f"   ⚠️ Document lookup failed: {e}")
+            return None
+
+    def register_document(self, url, doc_hash, storage_path, size_bytes, is_new, validators=None):
+        """validators: ETag / Last-Modified the server sent with this copy (used by refresh mode)"""
+        if is_new:
+            self.supabase.table(DOCUMENTS_TABLE).upsert({
+                "doc_hash": doc_hash,
+                "storage_path": storage_path,
+                "file_type": "pdf",
+                "size_bytes": size_bytes
+            }, on_conflict="doc_hash").execute()
+        now = datetime.now(timezone.utc).isoformat()
+        self.supabase.table(DOCUMENT_URLS_TABLE).upsert({
+            "url": url,
+            "doc_hash": doc_hash,
+            "etag": (validators or {}).get("etag"),
+            "last_modified": (validators or {}).get("last_modified"),
+            "fetched_at": now,
+            "checked_at": now
+        }, on_conflict="url").execute()
+
+    def stream_document(self, response, max_bytes=MAX_DOCUMENT_BYTES):
+        """Read a streamed response into a SpooledDocument. Returns (file_type, doc)."""
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise DocumentTooLarge(f"Content-Length {int(declared)} > cap {max_bytes}")
+
+        doc = SpooledDocument()
+        file_type = None
+        limit = max_bytes
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                if file_type is None:
+                    file_type = sniff_file_type(chunk)
+                    # HTML ends up in a DB column: much tighter cap
+                    if file_type == 'html':
+                        limit = min(max_bytes, MAX_HTML_BYTES)
+                doc.write(chunk)
+                if doc.size > limit:
+                    raise DocumentTooLarge(f"{file_type.upper()} exceeded cap {limit} bytes")
+        except Exception:
+            doc.close()
+            raise
+        return file_type or 'html', doc
+
+    def store_pdf(self, doc_url, doc, validators=None):
+        """Upload a downloaded PDF under its content hash (skipped if already stored) and register
+        the URL. Returns (storage_path, doc_hash). New uploads are checked later by verify_uploads()."""
+        # Same bytes under another URL: point at the stored copy, skip the upload
+        doc_hash = doc.hexdigest
+        file_path = doc_storage_path(doc_hash)
+        known = self.find_document(doc_hash=doc_hash)
+        if known:
+            self.register_document(doc_url, doc_hash, known["storage_path"], doc.size, is_new=False, validators=validators)
+            print(f"   ♻️ Same content already stored: {known['storage_path']}")
+            return known["storage_path"], doc_hash
+
+        self.supabase.storage.from_(STORAGE_BUCKET).upload(
+            file_path, doc.payload(), 
+            file_options={"content-type": "application/pdf", "upsert": "true"}
+        )
+        with self._pending_lock:
+            self.pending_uploads[file_path] = (doc_hash, doc.size)
+
+        self.register_document(doc_url, doc_hash, file_path, doc.size, is_new=True, validators=validators)
+        print(f"   ☁️ Uploaded: {file_path} ({doc.size} bytes)")
+        return file_path, doc_hash
+
+    def verify_uploads(self):
+        """
+        Batched replacement for the old per-file HEAD check: one paged listing of
+        the docs/ prefix, reconciled against this run's uploads. Missing or
+        truncated objects send their keywords back to the download queue.
+        """
+        with self._pending_lock:
+            pending, self.pending_uploads = self.pending_uploads, {}
+        if not pending:
+            return {"verified": 0, "missing": 0, "requeued": 0}
+
+        print(f"\n🔎 Verifying {len(pending)} uploads against the bucket listing...")
+        try:
+            listed = list_bucket_objects(self.supabase, STORAGE_BUCKET, DOC_PREFIX)
+        except Exception as e:
+            # Not fatal: verify_pdf_uploads.py --fix reconciles the whole bucket later
+            print(f"   ❌ Bucket listing failed, uploads not verified: {e}")
+            return {"verified": 0, "missing": 0, "requeued": 0}
+
+        verified, missing = reconcile({path: size for path, (_, size) in pending.items()}, listed)
+        requeued = 0
+        if missing:
+            print(f"   ❌ {len(missing)} uploads missing or incomplete in storage, re-queueing for download")
+            with self.db_slots:
+                requeued = requeue_missing(self.supabase, [pending[path][0] for path in missing],
+                                           documents_table=DOCUMENTS_TABLE, document_urls_table=DOCUMENT_URLS_TABLE)
+        print(f"   ✅ Verified {len(verified)} / {len(pending)} uploads ({requeued} keywords re-queued)")
+        return {"verified": len(verified), "missing": len(missing), "requeued": requeued}
+
     def download_and_upload(self, doc_url, slug, file_type):
+        """Returns (storage_path | "HTML_CONTENT", file_type, html_content, doc_hash); Nones on failure."""
         try:
             print(f"   ⬇️ Downloading (Bypassing SSL): {doc_url}")
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            # verify=False is critical for CDPH and other gov sites
-            with requests.get(doc_url, headers=headers, stream=True, timeout=30, verify=False) as r:
+            # Pooled keep-alive session, per-host cap and adaptive timeout (verify=False, see __init__)
+            with self.http.stream(doc_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30) as r:
                 r.raise_for_status()
-                content_type = r.headers.get('Content-Type', '').lower()
-                
-                # Check actual content type
-                actual_file_type = 'pdf' if 'pdf' in content_type else 'html'
-                
+                # Check actual content type (magic bytes, not the header)
+                actual_file_type, doc = self.stream_document(r)
+                encoding = r.encoding or 'utf-8'
+                validators = response_validators(r)
+
+            try:
                 if actual_file_type == 'html':
-                    # Instead of uploading to bucket, just return HTML text
-                    # We will save this directly to the database
-                    html_content = r.text
-                    print(f"   ☁️ Downloaded HTML content ({len(html_content)} bytes)")
-                    return "HTML_CONTENT", actual_file_type, html_content
-                else:
-                    file_path = f"{slug}.pdf"
-                    self.supabase.storage.from_(STORAGE_BUCKET).upload(
-                        file_path, r.content, 
-                        file_options={"content-type": "application/pdf", "upsert": "true"}
-                    )
-                    
-                    # Strict check to verify file exists in bucket before marking DB
-                    try:
-                        # We use the public URL and verify it returns 200 OK
-                        public_url = self.supabase.storage.from_(STORAGE_BUCKET).get_public_url(file_path)
-                        verify_req = requests.head(public_url, timeout=10)
-                        if verify_req.status_code >= 400:
-                            print(f"   ❌ Upload Verification Failed: 404 Not Found at {public_url}")
-                            return None, None, None
-                    except Exception as ve:
-                        print(f"   ❌ Upload Verification Exception: {ve}")
-                        return None, None, None
-                        
-                    print(f"   ☁️ Uploaded and Verified: {file_path}")
-                    return file_path, actual_file_type, None
+                    # Instead of uploading to bucket, keep the page inline in the database:
+                    # main-content text only, compressed (decode with matrix_html.html_text)
+                    html_content = pack_html(doc.getvalue().decode(encoding, errors='replace'),
+                                             raw_size=doc.size, raw_sha256=doc.hexdigest)
+                    print(f"   ☁️ Downloaded HTML content ({doc.size} bytes -> {len(html_content)} stored)")
+                    return "HTML_CONTENT", actual_file_type, html_content, None
+
+                file_path, doc_hash = self.store_pdf(doc_url, doc, validators)
+                return file_path, actual_file_type, None, doc_hash
+            finally:
+                doc.close()
+        except DocumentTooLarge as e:
+            print(f"   ❌ Download Aborted: {e}")
+            return None, None, None, None
         except Exception as e:
             print(f"   ❌ Download Failed: {e}")
-            return None, None, None
+            return None, None, None, None
+
+    def process_task(self, task):
+        """Search -> download -> DB update for one keyword. Returns the outcome."""
+        print(f"\n======== Processing Task {task.get('id')} ========")
+        print(f"🔍 Searching: {task['keyword']}")
+        
+        # 1. Search for document (Double Tap; each Tavily call takes its own search slot)
+        result = self.search_document(task['keyword'], task.get('category'))
+        
+        if not result:
+            print("   🚫 No document found via Tavily.")
+            return "not_found"
+
+        doc_url = result['url']
+        doc_type = result.get('file_type', 'pdf')
+        print(f"   🎯 Found {doc_type.upper()} URL: {doc_url}")
+        
+        # 2. Download & Process (skipped when this URL already resolved to a stored document)
+        with self.url_lock(doc_url):
+            known = self.find_document(url=doc_url)
+            if known:
+                print(f"   ♻️ Known document for URL: {known['storage_path']}")
+                path, actual_type, html_content, doc_hash = known["storage_path"], known["file_type"], None, known["doc_hash"]
+            else:
+                with self.download_slots:
+                    path, actual_type, html_content, doc_hash = self.download_and_upload(doc_url, task['slug'], doc_type)
+        
+        with self.db_slots:
+            if path:
+                # Success
+                update_data = {
+                    "is_downloaded": True, 
+                    "state": "downloaded",
+                    "pdf_url": doc_url,  # Optional: Store source URL if schema allows
+                    "file_type": actual_type
+                }
+                if actual_type == 'html' and html_content:
+                    update_data["content_raw"] = html_content
+                if doc_hash:
+                    update_data["doc_hash"] = doc_hash
+                    
+                self.supabase.table("grich_keywords_pool").update(update_data).eq("id", task['id']).execute()
+                print(f"   ✅ [DB Success] Task {task.get('id')} marked as downloaded ({actual_type}).")
+                return "downloaded"
+            else:
+                # Download failed but search succeeded
+                self.supabase.table("grich_keywords_pool").update({
+                    "state": "download_failed"
+                }).eq("id", task['id']).execute()
+                print(f"   ⚠️ [DB Update] Task {task.get('id')} marked as download_failed.")
+                return "download_failed"
+
+    def fetch_stale_documents(self, limit=REFRESH_BATCH, older_than_days=REFRESH_AFTER_DAYS):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+        print(f"📋 Fetching up to {limit} source URLs not checked since {cutoff[:10]}...")
+        try:
+            res = self.supabase.table(DOCUMENT_URLS_TABLE)\
+                .select("url, doc_hash, etag, last_modified, checked_at")\
+                .lt("checked_at", cutoff)\
+                .order("checked_at")\
+                .limit(limit)\
+                .execute()
+            return res.data
+        except Exception as e:
+            print(f"❌ Fetch Error: {e}")
+            return []
+
+    def touch_document_url(self, url, validators=None):
+        """Record a check that found no change (refreshing validators the server sent)"""
+        update = {"checked_at": datetime.now(timezone.utc).isoformat()}
+        for field, value in (validators or {}).items():
+            if value:
+                update[field] = value
+        self.supabase.table(DOCUMENT_URLS_TABLE).update(update).eq("url", url).execute()
+
+    def requeue_keywords(self, url, doc_hash):
+        """Point keywords sourced from `url` at the new document and send them back to the refiner"""
+        res = self.supabase.table("grich_keywords_pool").update({
+            "doc_hash": doc_hash,
+            "content_json": None,
+            "is_refined": False
+        }).eq("pdf_url", url).eq("file_type", "pdf").execute()
+        return len(res.data or [])
+
+    def refresh_document(self, row):
+        """Conditional GET for one stored source URL. Returns the outcome."""
+        url = row["url"]
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        if row.get("etag"):
+            headers["If-None-Match"] = row["etag"]
+        if row.get("last_modified"):
+            headers["If-Modified-Since"] = row["last_modified"]
+
+        with self.url_lock(url):
+            with self.download_slots:
+                try:
+                    with self.http.stream(url, headers=headers, timeout=30) as r:
+                        if r.status_code == 304:
+                            self.touch_document_url(url)
+                            return "not_modified"
+                        if r.status_code in (404, 410):
+                            # Keep serving the stored copy; the check date still moves on
+                            print(f"   ⚠️ Source gone ({r.status_code}): {url}")
+                            self.touch_document_url(url)
+                            return "gone"
+                        r.raise_for_status()
+                        file_type, doc = self.stream_document(r)
+                        validators = response_validators(r)
+                except Exception as e:
+                    print(f"   ❌ Refresh Failed: {url}: {e}")
+                    return "error"
+
+                try:
+                    # Servers without validators answer 200 every time: the hash tells us if anything changed
+                    if doc.hexdigest == row["doc_hash"]:
+                        self.touch_document_url(url, validators)
+                        return "unchanged"
+                    if file_type != 'pdf':
+                        print(f"   ⚠️ URL no longer serves a PDF, keeping stored copy: {url}")
+                        self.touch_document_url(url)
+                        return "not_pdf"
+                    _, doc_hash = self.store_pdf(url, doc, validators)
+                finally:
+                    doc.close()
+
+        with self.db_slots:
+            requeued = self.requeue_keywords(url, doc_hash)
+        print(f"   🔁 Changed: {url} -> {doc_hash[:12]} ({requeued} keywords re-queued for refinement)")
+        return "changed"
+
+    def run_refresh(self, limit=REFRESH_BATCH, older_than_days=REFRESH_AFTER_DAYS):
+        """Freshness sweep: re-upload and re-refine only documents that actually changed."""
+        rows = self.fetch_stale_documents(limit, older_than_days)
+        if not rows:
+            print("💤 No source documents due for a refresh.")
+            return
+
+        outcomes = dict.fromkeys(("not_modified", "unchanged", "changed", "gone", "not_pdf", "error"), 0)
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.download_concurrency) as pool:
+            futures = {pool.submit(self.refresh_document, row): row for row in rows}
+            for future in as_completed(futures):
+                try:
+                    outcomes[future.result()] += 1
+                except Exception as e:
+                    print(f"   ❌ Refresh {futures[future]['url']} Error: {e}")
+                    outcomes["error"] += 1
+
+        elapsed = time.time() - started
+        upload_check = self.verify_uploads()
+        print("\n📊 Refresh Summary")
+        print(f"   URLs: {len(rows)} in {elapsed:.1f}s")
+        print(f"   304 Not Modified: {outcomes['not_modified']} | Same hash: {outcomes['unchanged']} | "
+              f"Changed: {outcomes['changed']} | Gone: {outcomes['gone']} | Not PDF: {outcomes['not_pdf']} | "
+              f"Errors: {outcomes['error']}")
+        print(f"   Upload check: {upload_check['verified']} verified, {upload_check['missing']} missing")
+        print(f"   Busiest hosts: {self.http.summary()}")
+        return outcomes
 
     def run_batch(self):
         tasks = self.fetch_pending_tasks()
@@ -216,45 +637,64 @@ class MatrixLibrarian:
             print("💤 No pending tasks found in DB. Check if 'grich_keywords_pool' has entries with is_downloaded=false.")
             return
 
-        for task in tasks:
-            print(f"\n======== Processing Task {task.get('id')} ========")
-            print(f"🔍 Searching: {task['keyword']}")
-            
-            # 1. Search for document (Double Tap)
-            result = self.search_document(task['keyword'])
-            
-            if result:
-                doc_url = result['url']
-                doc_type = result.get('file_type', 'pdf')
-                print(f"   🎯 Found {doc_type.upper()} URL: {doc_url}")
-                
-                # 2. Download & Process
-                path, actual_type, html_content = self.download_and_upload(doc_url, task['slug'], doc_type)
-                
-                if path:
-                    # Success
-                    update_data = {
-                        "is_downloaded": True, 
-                        "state": "downloaded",
-                        "pdf_url": doc_url,  # Optional: Store source URL if schema allows
-                        "file_type": actual_type
-                    }
-                    if actual_type == 'html' and html_content:
-                        update_data["content_raw"] = html_content
-                        
-                    self.supabase.table("grich_keywords_pool").update(update_data).eq("id", task['id']).execute()
-                    print(f"   ✅ [DB Success] Marked as downloaded ({actual_type}).")
-                else:
-                    # Download failed but search succeeded
-                    self.supabase.table("grich_keywords_pool").update({
-                        "state": "download_failed"
-                    }).eq("id", task['id']).execute()
-                    print("   ⚠️ [DB Update] Marked as download_failed.")
-            else:
-                print("   🚫 No document found via Tavily.")
-            
-            time.sleep(1) # Rate limit protection
+        workers = max(self.search_concurrency, self.download_concurrency, self.db_concurrency)
+        print(f"⚙️ Concurrency: search={self.search_concurrency} download={self.download_concurrency} db={self.db_concurrency}")
+        outcomes = {"downloaded": 0, "download_failed": 0, "not_found": 0, "error": 0}
+        started = time.time()
+
+        if workers == 1:
+            for task in tasks:
+                try:
+                    outcomes[self.process_task(task)] += 1
+                except Exception as e:
+                    print(f"   ❌ Task {task.get('id')} Error: {e}")
+                    outcomes["error"] += 1
+                time.sleep(1) # Rate limit protection
+        else:
+            # The stage semaphores, not a sleep, keep us polite in concurrent mode
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self.process_task, task): task for task in tasks}
+                for future in as_completed(futures):
+                    try:
+                        outcomes[future.result()] += 1
+                    except Exception as e:
+                        print(f"   ❌ Task {futures[future].get('id')} Error: {e}")
+                        outcomes["error"] += 1
+
+        elapsed = time.time() - started
+        upload_check = self.verify_uploads()
+        print("\n📊 Librarian Throughput Summary")
+        print(f"   Tasks: {len(tasks)} in {elapsed:.1f}s ({len(tasks) / elapsed * 60:.1f} tasks/min)")
+        print(f"   Downloaded: {outcomes['downloaded']} | Download failed: {outcomes['download_failed']} | "
+              f"Not found: {outcomes['not_found']} | Errors: {outcomes['error']}")
+        print(f"   Upload check: {upload_check['verified']} verified, {upload_check['missing']} missing "
+              f"({upload_check['requeued']} keywords re-queued)")
+        print(f"   Search cache: {self.tavily.cache_summary()}")
+        print(f"   Tavily keys: {self.tavily.pool.summary()}")
+        print(f"   Busiest hosts: {self.http.summary()}")
+        print(f"   Search taps ({'speculative' if self.speculative else 'sequential'}):")
+        for line in self.tap_stats.summary_lines():
+            print(f"      {line}")
+        return outcomes
 
 if __name__ == "__main__":
-    librarian = MatrixLibrarian()
-    librarian.run_batch()
+    parser = argparse.ArgumentParser(description="Matrix Librarian")
+    parser.add_argument("--search-concurrency", type=int, default=SEARCH_CONCURRENCY, help="Tavily searches in flight.")
+    parser.add_argument("--download-concurrency", type=int, default=DOWNLOAD_CONCURRENCY, help="Downloads/uploads in flight.")
+    parser.add_argument("--db-concurrency", type=int, default=DB_CONCURRENCY, help="DB updates in flight.")
+    parser.add_argument("--no-search-cache", action="store_true", help="Bypass the local Tavily result cache.")
+    parser.add_argument("--speculative", action="store_true", default=SPECULATIVE_SEARCH,
+                        help="Run the PDF and HTML search taps in parallel (PDF preferred).")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Freshness sweep over stored source documents instead of processing new tasks.")
+    parser.add_argument("--refresh-after-days", type=float, default=REFRESH_AFTER_DAYS,
+                        help="Only re-check URLs not checked for this many days.")
+    parser.add_argument("--refresh-limit", type=int, default=REFRESH_BATCH, help="URLs per refresh run.")
+    args = parser.parse_args()
+
+    librarian = MatrixLibrarian(args.search_concurrency, args.download_concurrency, args.db_concurrency,
+                                use_search_cache=not args.no_search_cache, speculative=args.speculative)
+    if args.refresh:
+        librarian.run_refresh(args.refresh_limit, args.refresh_after_days)
+    else:
+        librarian.run_batch()
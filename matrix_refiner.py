@@ -1,19 +1,34 @@
 import os
 import json
 import time
-import pdfplumber
+import tempfile
 import requests
 from openai import OpenAI
 from supabase import create_client, Client
 import argparse
 from matrix_config import config
+from matrix_storage import doc_storage_path, STORAGE_BUCKET, DOCUMENTS_TABLE
+from matrix_html import html_text
+from matrix_extract import ExtractionEngine, MAX_PAGES, extraction_cache_key
+from matrix_cache import SizeLRUCache, CACHE_DIR
 
 # ================= Configuration =================
-STORAGE_BUCKET = "raw-handbooks"
+# PDFs downloaded and handed to the extraction engine ahead of the record being refined
+EXTRACT_AHEAD = int(os.environ.get("EXTRACT_AHEAD", 2))
+# Downloads are handed to the extractor as bytes; larger objects are spooled to a
+# private temp file so the workers don't each get a copy of the whole document
+SPOOL_THRESHOLD = int(os.environ.get("PDF_SPOOL_THRESHOLD", 16 * 1024 * 1024))
+# Extracted high-value text per document, so a retried refine (e.g. after
+# ai_api_failed) or a prompt change skips the download and extraction
+EXTRACT_CACHE_PATH = os.path.join(CACHE_DIR, "extracted_text.sqlite")
+EXTRACT_CACHE_MAX_MB = float(os.environ.get("EXTRACT_CACHE_MAX_MB", 512))
 
 class MatrixRefiner:
-    def __init__(self, batch_size=30):
+    def __init__(self, batch_size=30, extract_workers=None, use_extract_cache=True):
         self.batch_size = batch_size
+        self.extract_workers = extract_workers
+        self._engine = None
+        self.extract_cache = SizeLRUCache(EXTRACT_CACHE_PATH, EXTRACT_CACHE_MAX_MB * 1e6) if use_extract_cache else None
         
         if not config.is_valid():
              raise ValueError("Configuration incomplete. Check Token..txt or environment variables.")
@@ -38,6 +53,23 @@ class MatrixRefiner:
         else:
             raise ValueError("[Error] Missing API Key. Please set DEEPSEEK_API_KEY or ZHIPU_API_KEY.")
 
+    @property
+    def engine(self):
+        """
+        Shared extraction pool, its size caps extraction work across all documents in flight.
+        Started on the first PDF: HTML-only / cached runs and scripts that only use
+        refine_with_ai never spawn worker processes.
+        """
+        if self._engine is None or self._engine.closed:
+            # (A closed engine here is one whose supervisor failed: its jobs were failed, start afresh)
+            self._engine = ExtractionEngine(self.extract_workers) if self.extract_workers else ExtractionEngine()
+        return self._engine
+
+    def shutdown(self):
+        if self._engine is not None:
+            self._engine.shutdown()
+            self._engine = None
+
     def fetch_unrefined_records(self):
         """Fetch records that are downloaded but have no content_json"""
         config.log("[Info] Fetching unrefined records...")
@@ -56,57 +88,59 @@ class MatrixRefiner:
             config.log(f"[Error] Fetch Error: {e}", level="ERROR")
             return []
 
-    def download_pdf(self, slug):
-        file_name = f"{slug}.pdf"
-        local_path = f"tmp_{file_name}"
+    def download_pdf(self, slug, doc_hash=None):
+        """PDF bytes, or the path of a private temp file above SPOOL_THRESHOLD (None on failure)"""
+        # Content-addressed object if the librarian recorded one, legacy {slug}.pdf otherwise
+        file_name = doc_storage_path(doc_hash) if doc_hash else f"{slug}.pdf"
         try:
             data = self.supabase.storage.from_(STORAGE_BUCKET).download(file_name)
-            with open(local_path, "wb") as f:
-                f.write(data)
-            return local_path
         except Exception as e:
             config.log(f"   [Error] Download failed: {e}", level="ERROR")
             return None
+        if len(data) <= SPOOL_THRESHOLD:
+            return data
+        fd, local_path = tempfile.mkstemp(prefix="matrix_refiner_", suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return local_path
 
-    def extract_high_value_text(self, pdf_path):
-        keywords = ["fee", "cost", "price", "requirement", "checklist", "application", "process", "reciprocity", "endorsement", "exam", "grade"]
-        
-        extracted_text = ""
-        total_pages = 0
-        read_pages = 0
-        
+    def discard_pdf(self, source):
+        """Drop a downloaded PDF (only spooled ones exist on disk)"""
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
+
+    def collect_extraction(self, job):
+        """
+        (high-value text, timeout marker) of an ExtractionJob. Text is None for empty / scanned
+        documents; the marker is None, or {"extraction_timeout": True, "missing_pages": [...]}
+        when a page or document deadline cut extraction short and the text is partial.
+        """
         try:
-            # Add timeout mechanism or safe open? pdfplumber doesn't have native timeout.
-            # We can just be careful.
-            with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(pdf.pages)
-                # LIMIT PAGES to avoid huge processing
-                max_pages_to_scan = 50 
-                
-                for i, page in enumerate(pdf.pages):
-                    if i >= max_pages_to_scan:
-                        config.log(f"   [Warn] Reached max page scan limit ({max_pages_to_scan}). Stopping extraction.", level="WARN")
-                        break
-                        
-                    try:
-                         # Sometimes extract_text hangs on complex layout
-                        text = page.extract_text() or ""
-                    except Exception as e:
-                        config.log(f"   [Warn] Page {i+1} extraction failed: {e}", level="WARN")
-                        continue
-                        
-                    text_lower = text.lower()
-                    if i < 3 or any(k in text_lower for k in keywords):
-                        extracted_text += f"\n--- Page {i+1} ---\n{text}"
-                        read_pages += 1
-                    
-            config.log(f"   [Info] Extracted {read_pages}/{total_pages} pages.")
-            if not extracted_text.strip():
-                 return None
-            return extracted_text
+            result = job.result()
+        except Exception as e:
+            config.log(f"   [Error] PDF Extraction Error: {e}", level="ERROR")
+            return None, None
+        if result["truncated"]:
+            config.log(f"   [Warn] Reached max page scan limit ({MAX_PAGES}). Stopping extraction.", level="WARN")
+        for i, error in result["errors"]:
+            config.log(f"   [Warn] Page {i+1} extraction failed: {error}", level="WARN")
+        tiers = ", ".join(f"{tier} {n}" for tier, n in sorted(result["tiers"].items()))
+        config.log(f"   [Info] Extracted {result['read_pages']}/{result['total_pages']} pages in {result['seconds']:.1f}s ({tiers}).")
+        marker = None
+        if result["extraction_timeout"]:
+            marker = {"extraction_timeout": True, "missing_pages": result["missing_pages"]}
+            config.log(f"   [Warn] Extraction timeout, partial text (missing pages {result['missing_pages']}).", level="WARN")
+        if not result["text"].strip():
+            return None, marker
+        return result["text"], marker
+
+    def extract_high_value_text(self, source):
+        try:
+            job = self.engine.submit(source)
         except Exception as e:
             config.log(f"   [Error] PDF Extraction Error: {e}", level="ERROR")
             return None
+        return self.collect_extraction(job)[0]
 
     def refine_with_ai(self, raw_text):
         prompt = """
@@ -164,14 +198,34 @@ class MatrixRefiner:
             config.log(f"   [Error] AI API Error ({self.model}): {e}", level="ERROR")
             return None
 
-    def update_db(self, record_id, json_data):
+    def fetch_document_result(self, doc_hash):
+        """Refine result already produced for this exact document (any keyword), or None"""
+        try:
+            res = self.supabase.table(DOCUMENTS_TABLE).select("content_json").eq("doc_hash", doc_hash).limit(1).execute()
+            return res.data[0]["content_json"] if res.data else None
+        except Exception as e:
+            config.log(f"   [Warn] Document result lookup failed: {e}", level="WARN")
+            return None
+
+    def store_document_result(self, doc_hash, parsed):
+        try:
+            self.supabase.table(DOCUMENTS_TABLE).update({"content_json": parsed}).eq("doc_hash", doc_hash).execute()
+        except Exception as e:
+            config.log(f"   [Warn] Could not store document result: {e}", level="WARN")
+
+    def update_db(self, record_id, json_data, marker=None):
+        """Returns the parsed result on success, None if the JSON was unusable.
+        `marker` (e.g. the extraction timeout record) is merged into the stored result."""
         try:
             parsed = json.loads(json_data)
+            if marker and isinstance(parsed, dict):
+                parsed.update(marker)
             self.supabase.table("grich_keywords_pool").update({
                 "content_json": parsed,
                 "is_refined": True
             }).eq("id", record_id).execute()
             config.log("   [Success] Database Updated.")
+            return parsed
         except json.JSONDecodeError:
             config.log("   [Error] Failed to parse JSON.", level="ERROR")
             # Mark as refined but with error so we don't loop
@@ -179,6 +233,7 @@ class MatrixRefiner:
                 "content_json": {"error": "json_parse_failed"},
                 "is_refined": True
             }).eq("id", record_id).execute()
+            return None
 
     def mark_failed_refine(self, record_id, reason):
         # Update content_json with error to stop loop
@@ -188,6 +243,49 @@ class MatrixRefiner:
             "is_refined": True # Mark refined so we don't retry same bad file
         }).eq("id", record_id).execute()
 
+    def prepare_record(self, record, claimed):
+        """
+        Everything before the AI call. Returns (kind, payload):
+        ("reuse", result) | ("html", text) | ("cached", text) | ("pdf", (source, job)) | ("later", None) | ("failed", reason).
+        `claimed` holds doc_hashes already being extracted in this batch ("later" = wait for that one).
+        """
+        doc_hash = record.get('doc_hash')
+
+        # Same document already refined for another keyword: reuse it
+        if doc_hash:
+            reused = self.fetch_document_result(doc_hash)
+            if reused:
+                return "reuse", reused
+            if doc_hash in claimed:
+                return "later", None
+
+        # HTML sources are stored inline (compressed main text), not in the bucket
+        if record.get('file_type') == 'html':
+            text = html_text(record.get('content_raw'))
+            return ("html", text) if text else ("failed", "empty_html_content")
+
+        # Extracted before (e.g. the AI call failed last time): no download, no extraction
+        if doc_hash and self.extract_cache is not None:
+            text = self.extract_cache.get(extraction_cache_key(doc_hash))
+            if text:
+                claimed.add(doc_hash)
+                return "cached", text
+
+        # 1. Download
+        source = self.download_pdf(record['slug'], doc_hash)
+        if not source:
+            return "failed", "storage_download_failed"
+        # 2. Extract (in the background, on the engine's worker pool)
+        try:
+            job = self.engine.submit(source)
+        except Exception as e:
+            config.log(f"   [Error] PDF Extraction Error: {e}", level="ERROR")
+            self.discard_pdf(source)
+            return "failed", "empty_text_or_scan"
+        if doc_hash:
+            claimed.add(doc_hash)
+        return "pdf", (source, job)
+
     def run_batch(self):
         records = self.fetch_unrefined_records()
         if not records:
@@ -196,43 +294,70 @@ class MatrixRefiner:
 
         config.log(f"[Info] Processing {len(records)} records...")
         failures = []
+        prepared = {}
+        claimed = set()
         
-        for record in records:
+        for idx, record in enumerate(records):
+            # Keep the next EXTRACT_AHEAD records downloaded and extracting while we refine this one
+            for ahead in range(idx, min(len(records), idx + 1 + EXTRACT_AHEAD)):
+                if ahead not in prepared:
+                    prepared[ahead] = self.prepare_record(records[ahead], claimed)
+            kind, payload = prepared.pop(idx)
+            if kind == "later":
+                # An earlier record carried the same document: its result should be stored by now
+                claimed.discard(record.get('doc_hash'))
+                kind, payload = self.prepare_record(record, claimed)
+
             slug = record['slug']
             rid = record['id']
+            doc_hash = record.get('doc_hash')
             config.log(f"\n[Working] Refining: {slug}")
-            
-            # 1. Download
-            pdf_path = self.download_pdf(slug)
-            if not pdf_path: 
-                self.mark_failed_refine(rid, "storage_download_failed")
-                failures.append(slug)
+
+            if kind == "reuse":
+                config.log(f"   [Info] Reusing refine result of document {doc_hash[:12]}.")
+                self.update_db(rid, json.dumps(payload))
                 continue
-            
-            # 2. Extract
-            text = self.extract_high_value_text(pdf_path)
-            if not text:
-                config.log("   [Warn] Empty text or scan.", level="WARN")
-                self.mark_failed_refine(rid, "empty_text_or_scan")
+            if kind == "failed":
+                self.mark_failed_refine(rid, payload)
                 failures.append(slug)
-                if os.path.exists(pdf_path): os.remove(pdf_path)
                 continue
+
+            marker = None
+            if kind == "html":
+                text = payload
+            elif kind == "cached":
+                config.log(f"   [Info] Using cached extraction of document {doc_hash[:12]}.")
+                text = payload
+            else:
+                source, job = payload
+                text, marker = self.collect_extraction(job)
+                self.discard_pdf(source)
+                if not text:
+                    config.log("   [Warn] Empty text or scan.", level="WARN")
+                    self.mark_failed_refine(rid, "extraction_timeout" if marker else "empty_text_or_scan")
+                    failures.append(slug)
+                    continue
+                # Partial (timed out) text isn't cached, so a later run gets another go at it
+                if doc_hash and not marker and self.extract_cache is not None:
+                    self.extract_cache.set(extraction_cache_key(doc_hash), text)
             
             # 3. Refine
             json_result = self.refine_with_ai(text)
             
             # 4. Update
             if json_result:
-                self.update_db(rid, json_result)
+                parsed = self.update_db(rid, json_result, marker)
+                # A result from partial (timed out) text stays with this keyword: shared, it would stop the document being extracted again
+                if parsed and doc_hash and not marker:
+                    self.store_document_result(doc_hash, parsed)
             else:
                 self.mark_failed_refine(rid, "ai_api_failed")
                 failures.append(slug)
             
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-            
             time.sleep(1)
             
+        if self.extract_cache is not None:
+            config.log(f"\n[Info] Extraction cache: {self.extract_cache.summary()}")
         if failures:
             config.log("\n[Warn] Failure Report (Saved to DB as errors):", level="WARN")
             for f in failures:
@@ -241,7 +366,14 @@ class MatrixRefiner:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Matrix Refiner")
     parser.add_argument("--batch", type=int, default=30, help="Batch size to process.")
+    parser.add_argument("--extract-workers", type=int, default=None,
+                        help="Extraction processes shared by all documents (default: EXTRACT_WORKERS / CPU count).")
+    parser.add_argument("--no-extract-cache", action="store_true", help="Bypass the local extracted-text cache.")
     args = parser.parse_args()
     
-    refiner = MatrixRefiner(batch_size=args.batch)
-    refiner.run_batch()
+    refiner = MatrixRefiner(batch_size=args.batch, extract_workers=args.extract_workers,
+                            use_extract_cache=not args.no_extract_cache)
+    try:
+        refiner.run_batch()
+    finally:
+        refiner.shutdown()
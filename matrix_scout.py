@@ -3,53 +3,344 @@ import time
 import random
 import re
 import json
+import asyncio
+import argparse
+import hashlib
+import subprocess
+import sys
+import threading
 import requests
 import csv
 from datetime import datetime, timezone
 from supabase import create_client, Client
 from matrix_config import config
+from matrix_cache import TTLCache, normalize_query, CACHE_DIR
+from matrix_seen import SeenSlugFilter, SEEN_PATH
+from matrix_classify import CLASSIFIER, UNCATEGORIZED
 
 # ================= Configuration & Constants =================
 SKILL_FILE = os.path.join(".agent", "skills", "01-grich-miner", "SKILL.md")
 SEED_CSV = "heavy_mine_20260113.csv"
+AUTOCOMPLETE_URL = "https://www.google.com/complete/search"
 
-# V42.4 Dyeing Protocol
-DYE_MAP = [
-    (r"lawyer|attorney|bar\s?exam|legal|juris", "Law", "Blue"),
-    (r"nurse|doctor|medical|clinic|rn|lpn|physician|health|surgery", "Medical", "Green"),
-    (r"accountant|cpa|finance|audit|tax|acc", "Finance", "Black"),
-    (r"teacher|education|school|pedagog|tutor|tefl", "Education", "Orange"),
-    (r"real\s?estate|realtor|broker|property", "RealEstate", "Red"),
-    (r"engineer|architect|civil|structur|mechanic", "Engineer", "Cyan"),
-    (r"electrician|hvac|plumb|welder|construct|wireman|journeyman", "Trades", "Yellow")
-]
-
-STATES = {
-    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
-    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA",
-    "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
-    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
-    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
-    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
-    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
-    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
-    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
-    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
-    "dc": "DC", "district of columbia": "DC"
-}
+# Crawl Throttle (Env Var > Default)
+# Defaults approximate the old fixed sleeps: one query in flight, ~0.5 queries/sec.
+SCOUT_CONCURRENCY = int(os.environ.get("SCOUT_CONCURRENCY", 1))
+SCOUT_RATE = float(os.environ.get("SCOUT_RATE", 0.5))        # Tokens (queries) per second
+SCOUT_BURST = int(os.environ.get("SCOUT_BURST", 1))          # Bucket capacity
+SCOUT_JITTER = float(os.environ.get("SCOUT_JITTER", 0.5))    # Random extra delay per query (s)
+ERROR_BACKOFF = 5
+
+# Suggestion Cache (Env Var > Default)
+SUGGEST_CACHE_PATH = os.path.join(CACHE_DIR, "scout_suggestions.sqlite")
+SUGGEST_CACHE_TTL = float(os.environ.get("SCOUT_CACHE_TTL", 7 * 24 * 3600))  # Seconds; <= 0 never expires
+
+# Crawl Frontier / Checkpoint (Env Var > Default)
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "scout_frontier.json")
+CHECKPOINT_EVERY = int(os.environ.get("SCOUT_CHECKPOINT_EVERY", 50))  # Completed work items
+# Skip L3 under an L2 prefix whose new-slug ratio is below this (0 disables pruning)
+L3_MIN_NOVELTY = float(os.environ.get("SCOUT_L3_MIN_NOVELTY", 0.1))
+STATS_PATH = os.path.join(CACHE_DIR, "scout_stats.json")
+
+# Write-Behind Buffer (Env Var > Default)
+DB_TABLE = "grich_keywords_pool"
+FLUSH_SIZE = int(os.environ.get("SCOUT_FLUSH_SIZE", 500))            # Rows per upsert call
+FLUSH_INTERVAL = float(os.environ.get("SCOUT_FLUSH_INTERVAL", 10.0)) # Max seconds a row waits
+
+def positive_rate(text):
+    """argparse type for --rate: queries/sec, must be > 0"""
+    rate = float(text)
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"rate must be > 0 queries/sec (got {text})")
+    return rate
+
+def parse_shard(text):
+    """'2/4' -> (2, 4): shard 2 of 4, 1-based"""
+    index, count = (int(x) for x in text.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{text}': expected i/n with 1 <= i <= n")
+    return index, count
+
+def shard_of(seed, count):
+    """Stable 1-based shard for a seed (same on every host and run)"""
+    digest = hashlib.sha1(normalize_query(seed).encode("utf-8")).hexdigest()
+    return int(digest, 16) % count + 1
+
+def shard_path(path, shard):
+    """scout_frontier.json -> scout_frontier.shard2of4.json"""
+    if not shard:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard[0]}of{shard[1]}{ext}"
+
+class CrawlFrontier:
+    """
+    Explicit crawl frontier: pending (seed, prefix, layer) work items plus a
+    cursor into the seed list. Seeds are mined one at a time; an item's
+    children are queued when it completes (L1 -> 26 L2 prefixes, L2 with
+    suggestions -> 26 L3 prefixes). Child order is a deterministic shuffle of
+    (shuffle_seed, seed, prefix), so a resumed run expands exactly the same
+    prefixes. save()/load() checkpoint it as JSON.
+    """
+    def __init__(self, seeds, path=CHECKPOINT_PATH, shuffle_seed=None):
+        self.seeds = list(seeds)
+        self.path = path
+        self.shuffle_seed = shuffle_seed if shuffle_seed is not None else random.randrange(2 ** 31)
+        self.seed_cursor = 0
+        self.pending = {}   # query -> item, in insertion order
+        self.completed = 0
+        self.pruned = 0     # Child queries skipped by the yield policy
+        # Pending queries restored from a checkpoint. Their rows may have been flushed before
+        # the crash, so re-measured novelty would see them as known: they are never pruned.
+        self.resumed = set()
+
+    @staticmethod
+    def query(item):
+        seed, prefix, _ = item
+        return f"{seed} {prefix}" if prefix else seed
+
+    def seeds_digest(self):
+        return hashlib.sha1("\n".join(self.seeds).encode("utf-8")).hexdigest()
+
+    @property
+    def current_seed(self):
+        return self.seeds[self.seed_cursor] if self.seed_cursor < len(self.seeds) else None
+
+    def push(self, item):
+        self.pending[self.query(item)] = tuple(item)
+
+    def children(self, item, suggestions):
+        seed, prefix, layer = item
+        # L1 always fans out; L2 only if Google had anything for it; L3 is a leaf
+        if layer == 1 or (layer == 2 and suggestions):
+            alpha = list(ALPHABET)
+            random.Random(f"{self.shuffle_seed}|{seed}|{prefix}").shuffle(alpha)
+            return [(seed, prefix + c, layer + 1) for c in alpha]
+        return []
+
+    def complete(self, item, suggestions, prune=False):
+        """Mark an item done and queue its children (none if pruned); returns the children."""
+        self.pending.pop(self.query(item), None)
+        self.resumed.discard(self.query(item))
+        self.completed += 1
+        kids = self.children(item, suggestions)
+        if prune:
+            self.pruned += len(kids)
+            return []
+        for kid in kids:
+            self.push(kid)
+        return kids
+
+    def snapshot(self):
+        return {
+            "shuffle_seed": self.shuffle_seed,
+            "seeds_digest": self.seeds_digest(),
+            "seed_cursor": self.seed_cursor,
+            "completed": self.completed,
+            "pruned": self.pruned,
+            "pending": [list(item) for item in self.pending.values()],
+            "saved_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def save(self, state=None):
+        """Atomic write of a snapshot (taken now unless given)"""
+        state = state or self.snapshot()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, seeds, path=CHECKPOINT_PATH):
+        """Restore a checkpoint for this seed list (None if missing or for other seeds)"""
+        if not os.path.exists(path):
+            config.log(f"[Warn] No checkpoint at {path}. Starting fresh.", level="WARN")
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception as e:
+            config.log(f"[Error] Checkpoint unreadable ({e}). Starting fresh.", level="ERROR")
+            return None
+
+        frontier = cls(seeds, path, state["shuffle_seed"])
+        if state["seeds_digest"] != frontier.seeds_digest():
+            config.log("[Warn] Checkpoint was written for a different seed list. Starting fresh.", level="WARN")
+            return None
+        frontier.seed_cursor = state["seed_cursor"]
+        frontier.completed = state["completed"]
+        frontier.pruned = state.get("pruned", 0)
+        for item in state["pending"]:
+            frontier.push(item)
+        frontier.resumed = set(frontier.pending)
+        return frontier
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `capacity`.
+    Every autocomplete query takes one token, so throughput is capped at `rate`
+    no matter how many queries are in flight.
+    """
+    def __init__(self, rate, capacity=1, jitter=0.0):
+        if not rate > 0:
+            raise ValueError(f"Token bucket rate must be > 0 queries/sec (got {rate})")
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.jitter = float(jitter)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        if self.jitter > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+
+    def penalize(self, seconds):
+        """Drain the bucket so every worker pauses after a ban/network error."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class KeywordWriter:
+    """
+    Write-behind buffer for grich_keywords_pool.
+    Rows are deduped by slug while pending and flushed as one multi-row
+    upsert(on_conflict="slug") once `flush_size` rows are queued or the oldest
+    pending row is older than `flush_interval` seconds. Thread-safe, because
+    process_batch runs in worker threads during the async crawl.
+    Rows of a failed upsert are kept and retried with the next flush; sync()
+    tells a checkpoint whether everything queued so far has really been written.
+    """
+    def __init__(self, supabase, table=DB_TABLE, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.supabase = supabase
+        self.table = table
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.pending_since = None
+        self.failed = {}      # slug -> row of failed upserts, retried with the next flush
+        self.in_flight = 0    # Flushes currently talking to the DB
+        self.stats = {"flushes": 0, "rows_written": 0, "rows_failed": 0, "dupes_merged": 0}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def add(self, row):
+        with self._lock:
+            if row["slug"] in self.pending:
+                self.stats["dupes_merged"] += 1
+            self.pending[row["slug"]] = row
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            due = len(self.pending) >= self.flush_size or \
+                time.monotonic() - self.pending_since >= self.flush_interval
+        if due:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        with self._lock:
+            if not self.pending and not self.failed:
+                return 0
+            rows = list({**self.failed, **self.pending}.values())   # A newer pending row wins over a failed one
+            self.pending = {}
+            self.pending_since = None
+            self.failed = {}
+            self.in_flight += 1
+
+        try:
+            for i in range(0, len(rows), self.flush_size):
+                chunk = rows[i:i + self.flush_size]
+                try:
+                    self.supabase.table(self.table).upsert(chunk, on_conflict="slug").execute()
+                    with self._lock:
+                        self.stats["flushes"] += 1
+                        self.stats["rows_written"] += len(chunk)
+                    config.log(f"   [DB] Flushed {len(chunk)} keywords.")
+                except Exception as e:
+                    with self._lock:
+                        self.stats["rows_failed"] += len(chunk)
+                        for row in chunk:
+                            if row["slug"] not in self.pending:
+                                self.failed[row["slug"]] = row
+                    config.log(f"   [Error] Bulk upsert of {len(chunk)} keywords failed (kept for retry): {e}", level="ERROR")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._idle.notify_all()
+        return len(rows)
+
+    def sync(self):
+        """
+        Flush, wait for flushes running in other threads, and return True only if
+        every row queued before the call is in the DB (False: some upsert failed).
+        """
+        self.flush()
+        with self._idle:
+            while self.in_flight:
+                self._idle.wait()
+            return not self.failed
+
+    def close(self):
+        """Flush whatever is left and report totals (call on shutdown). Returns True if nothing is left unwritten."""
+        ok = self.sync()
+        st = self.stats
+        config.log(f"[Info] Writer closed: {st['rows_written']} written in {st['flushes']} flushes, "
+                   f"{st['rows_failed']} failed attempts, {len(self.failed)} rows unwritten, "
+                   f"{st['dupes_merged']} in-batch duplicates merged.")
+        return ok
 
 class GrichMiner:
-    def __init__(self):
-        if not config.is_valid():
-            raise ValueError("Configuration incomplete. Check Token..txt or environment variables.")
-            
-        self.supabase: Client = create_client(config.supabase_url, config.supabase_key)
-        config.log(f"[Info] Connected to Supabase: {config.supabase_url}")
+    def __init__(self, concurrency=SCOUT_CONCURRENCY, rate=SCOUT_RATE, burst=SCOUT_BURST, jitter=SCOUT_JITTER,
+                 cache_ttl=SUGGEST_CACHE_TTL, use_cache=True, min_novelty=L3_MIN_NOVELTY, skip_known=True,
+                 supabase=None):
+        if supabase is not None:
+            # Injected client (benchmarks / offline runs)
+            self.supabase = supabase
+        else:
+            if not config.is_valid():
+                raise ValueError("Configuration incomplete. Check Token..txt or environment variables.")
+                
+            self.supabase: Client = create_client(config.supabase_url, config.supabase_key)
+            config.log(f"[Info] Connected to Supabase: {config.supabase_url}")
         
         self.ua_list = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
         ]
+        self.autocomplete_url = AUTOCOMPLETE_URL
+        self.writer = KeywordWriter(self.supabase)
+        self.cache = TTLCache(SUGGEST_CACHE_PATH, cache_ttl) if use_cache else None
+
+        # Yield tracking for L3 pruning; skip_known drops already-stored slugs before the upsert
+        self.min_novelty = min_novelty
+        self.skip_known = skip_known
+        self.seen = SeenSlugFilter(SEEN_PATH)
+        self.layer_stats = {layer: {"queries": 0, "suggestions": 0, "new": 0} for layer in (1, 2, 3)}
+
+        # Crawl throttle
+        self.concurrency = max(1, int(concurrency))
+        if not rate > 0:
+            raise ValueError(f"Scout rate must be > 0 queries/sec (got {rate}); check --rate / SCOUT_RATE")
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
 
     def load_csv_seeds(self):
         """Inject Fuel from CSV"""
@@ -71,22 +362,58 @@ class GrichMiner:
             config.log(f"[Error] CSV Load Error: {e}", level="ERROR")
             return []
 
-    def fetch_suggestions(self, query):
-        """Google Autocomplete API"""
-        url = f"https://www.google.com/complete/search?client=chrome&q={query}"
+    def query_autocomplete(self, query):
+        """Single Autocomplete request. Raises on network errors so callers choose the backoff."""
         # Random User Agent Rotation
         headers = {"User-Agent": random.choice(self.ua_list)}
+        res = requests.get(self.autocomplete_url, params={"client": "chrome", "q": query}, headers=headers, timeout=5)
+        # Non-200 (429 / captcha page) is an error: back off, and never cache it
+        res.raise_for_status()
         try:
-            res = requests.get(url, headers=headers, timeout=5)
-            if res.status_code == 200:
-                try:
-                    return json.loads(res.text)[1]
-                except:
-                    return []
+            return json.loads(res.text)[1]
+        except:
             return []
+
+    def cached_suggestions(self, query):
+        """Cache lookup (None on miss or when the cache is disabled)"""
+        if self.cache is None:
+            return None
+        return self.cache.get(normalize_query(query))
+
+    def store_suggestions(self, query, suggestions):
+        if self.cache is not None:
+            self.cache.set(normalize_query(query), suggestions)
+
+    def fetch_suggestions(self, query):
+        """Google Autocomplete API"""
+        cached = self.cached_suggestions(query)
+        if cached is not None:
+            return cached
+        try:
+            suggestions = self.query_autocomplete(query)
         except Exception as e:
-            time.sleep(5) # Backoff on error
+            time.sleep(ERROR_BACKOFF) # Backoff on error
             return []
+        self.store_suggestions(query, suggestions)
+        return suggestions
+
+    async def fetch_suggestions_async(self, query):
+        """Rate-limited Autocomplete call for the asyncio crawl"""
+        # Cache hits skip the network and don't spend rate budget
+        cached = self.cached_suggestions(query)
+        if cached is not None:
+            return cached
+        async with self.semaphore:
+            await self.bucket.acquire()
+            try:
+                suggestions = await asyncio.to_thread(self.query_autocomplete, query)
+            except Exception as e:
+                # Backoff on error: pause the whole crawl, not just this slot
+                config.log(f"   [Warn] Autocomplete failed for '{query}': {e} -> pausing {ERROR_BACKOFF}s", level="WARN")
+                self.bucket.penalize(ERROR_BACKOFF)
+                return []
+        self.store_suggestions(query, suggestions)
+        return suggestions
 
     def generate_slug(self, text):
         """Slug Processing"""
@@ -97,34 +424,30 @@ class GrichMiner:
 
     def extract_state(self, text):
         """Extract US State from text"""
-        text_lower = text.lower()
-        # Check for full names
-        for state_name, state_code in STATES.items():
-            if re.search(r'\b' + re.escape(state_name) + r'\b', text_lower):
-                return state_code
-        return None
+        return CLASSIFIER.classify(text)[0]
 
     def dye_keyword(self, keyword, seed_context=None):
         """V42.4 Dyeing Protocol with Context Inheritance"""
-        keyword_lower = keyword.lower()
-        
+        _, category, color = CLASSIFIER.classify(keyword)
+        return self.inherit_dye(category, color, seed_context)
+
+    def inherit_dye(self, category, color, seed_context=None):
         # 1. Direct Regex Match
-        for pattern, category, color in DYE_MAP:
-            if re.search(pattern, keyword_lower):
-                return category, color
-        
+        if category:
+            return category, color
+
         # 2. Context Inheritance
         if seed_context:
             return seed_context.get('category'), seed_context.get('color')
 
-        return "Uncategorized", "Gray" 
+        return UNCATEGORIZED
 
-    def save_keyword(self, keyword, seed_context=None):
-        """Upsert keyword to Supabase"""
+    def build_keyword_row(self, keyword, seed_context=None, classified=None):
+        """Build the grich_keywords_pool row for one suggestion"""
         slug = self.generate_slug(keyword)
+        state, category, color = classified or CLASSIFIER.classify(keyword)
         # Inherit context safely
-        category, color_tag = self.dye_keyword(keyword, seed_context)
-        state = self.extract_state(keyword)
+        category, color_tag = self.inherit_dye(category, color, seed_context)
         
         if not state:
             if seed_context and seed_context.get('state'):
@@ -132,7 +455,7 @@ class GrichMiner:
             else:
                state = "Unknown"
 
-        data = {
+        return {
             "keyword": keyword,
             "slug": slug,
             "category": category,
@@ -143,78 +466,264 @@ class GrichMiner:
             "last_mined_at": datetime.now(timezone.utc).isoformat()
         }
 
-        try:
-            self.supabase.table("grich_keywords_pool").upsert(data, on_conflict="slug").execute()
-            return True
-        except Exception as e:
-            return False
-
     def analyze_seed_context(self, seed_text):
         """Determine category/color/state for a seed"""
         cat, col = self.dye_keyword(seed_text)
         st = self.extract_state(seed_text)
         return {"category": cat, "color": col, "state": st}
 
-    def recursive_mine(self):
+    def recursive_mine(self, limit=None, resume=False, checkpoint_path=CHECKPOINT_PATH, shuffle_seed=None,
+                       shard=None, stats_path=None):
         """
         FULL THROTTLE: Seed + [a-z] + [a-z] (FULL)
+        shard=(i, n) mines only the seeds that hash to shard i, with its own checkpoint.
         """
+        started = time.time()
         config.log(f"[Info] Grich Miner V42.4 FULL THROTTLE MODE.")
         config.log("Protocol: CSV Injection | Full Alpha L3 | Anti-Ban Enabled")
+        config.log(f"Throttle: {self.concurrency} in flight | {self.rate} q/s | burst {self.burst}")
         
         seeds = self.load_csv_seeds()
+        if limit:
+            seeds = seeds[:limit]
+        if shard:
+            seeds = [seed for seed in seeds if shard_of(seed, shard[1]) == shard[0]]
+            checkpoint_path = shard_path(checkpoint_path, shard)
+            config.log(f"[Info] SHARD {shard[0]}/{shard[1]}: {len(seeds)} seeds.")
         if not seeds:
             config.log("No seeds loaded. Aborting.", level="WARN")
             return
 
-        alphabet = 'abcdefghijklmnopqrstuvwxyz'
-        total_seeds = len(seeds)
-        count = 0
+        self.load_seen_slugs()
+
+        frontier = CrawlFrontier.load(seeds, checkpoint_path) if resume else None
+        if frontier:
+            config.log(f"[Info] RESUME: seed {frontier.seed_cursor + 1}/{len(seeds)}, "
+                       f"{len(frontier.pending)} pending items, {frontier.completed} already done.")
+        else:
+            frontier = CrawlFrontier(seeds, checkpoint_path, shuffle_seed)
+        config.log(f"[Info] Checkpoint: {checkpoint_path} (shuffle seed {frontier.shuffle_seed})")
 
-        for seed in seeds:
-            count += 1
+        try:
+            asyncio.run(self.mine_seeds_async(frontier))
+        finally:
+            # Flush first: a checkpointed item must never have unwritten rows
+            if self.writer.close():
+                frontier.save()
+            else:
+                config.log("[Warn] Unwritten keywords left: keeping the last checkpoint, --resume redoes the rest.", level="WARN")
+            if self.cache is not None:
+                config.log(f"[Info] Suggestion cache: {self.cache.summary()}")
+                self.cache.close()
+            if stats_path:
+                self.save_stats(shard_path(stats_path, shard), frontier, time.time() - started)
+
+    def save_stats(self, path, frontier, elapsed):
+        """Run totals as JSON, so a launcher can merge shard results"""
+        stats = {
+            "seeds": len(frontier.seeds),
+            "completed": frontier.completed,
+            "pruned": frontier.pruned,
+            "layers": self.layer_stats,
+            "writer": self.writer.stats,
+            "cache_hits": self.cache.hits if self.cache is not None else 0,
+            "cache_misses": self.cache.misses if self.cache is not None else 0,
+            "elapsed": elapsed
+        }
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+
+    def load_seen_slugs(self):
+        """Preload slugs already in the pool (local copy + rows added since)"""
+        try:
+            self.seen = SeenSlugFilter.open(self.supabase, SEEN_PATH, DB_TABLE)
+            config.log(f"[Info] Seen filter: {len(self.seen)} known slugs (watermark id {self.seen.watermark}).")
+        except Exception as e:
+            config.log(f"[Warn] Seen filter refresh failed ({e}). Novelty is judged on this run only.", level="WARN")
+
+    async def mine_seeds_async(self, frontier):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = TokenBucket(self.rate, self.burst, self.jitter)
+        self._checkpointing = False
+
+        total_seeds = len(frontier.seeds)
+
+        while frontier.current_seed is not None:
+            seed = frontier.current_seed
             seed_context = self.analyze_seed_context(seed)
-            config.log(f"\n[{count}/{total_seeds}] ROOT JOB: {seed} ({seed_context.get('category')})")
-
-            # === Layer 1: Base Suggestions ===
-            l1_suggestions = self.fetch_suggestions(seed)
-            self.process_batch(l1_suggestions, seed_context, layer=1)
-
-            # === Layer 2: Alpha Expansion (Seed + a) ===
-            shuffled_alpha = list(alphabet)
-            random.shuffle(shuffled_alpha)
-            
-            for char1 in shuffled_alpha:
-                query_l2 = f"{seed} {char1}"
-                l2_suggestions = self.fetch_suggestions(query_l2)
-                self.process_batch(l2_suggestions, seed_context, layer=2)
-                
-                # === Layer 3: Full Alpha Expansion (Seed + a + b) ===
-                if l2_suggestions:
-                    # Full Alpha - Random Order
-                    sub_alpha = list(alphabet)
-                    random.shuffle(sub_alpha) 
-                    
-                    for char2 in sub_alpha:
-                            query_l3 = f"{seed} {char1}{char2}"
-                            l3_suggestions = self.fetch_suggestions(query_l3)
-                            self.process_batch(l3_suggestions, seed_context, layer=3)
-                            
-                            # Anti-Ban Delay (1.2 - 2.5s)
-                            time.sleep(random.uniform(1.2, 2.5)) 
-                
-                # Layer 2 Delay (2.0 - 4.0s)
-                time.sleep(random.uniform(2.0, 4.0)) 
+            config.log(f"\n[{frontier.seed_cursor + 1}/{total_seeds}] ROOT JOB: {seed} ({seed_context.get('category')})")
+
+            if not frontier.pending:
+                # === Layer 1: Base Suggestions ===
+                frontier.push((seed, "", 1))
+            else:
+                config.log(f"   [Resume] {len(frontier.pending)} pending items for this seed.")
+
+            await asyncio.gather(*(self.run_item(frontier, item, seed_context) for item in list(frontier.pending.values())))
+
+            frontier.seed_cursor += 1
+            await self.checkpoint(frontier)
+
+        config.log(f"\n[Info] Crawl complete: {frontier.completed} work items done.")
+        self.log_yield_report(frontier)
+
+    def log_yield_report(self, frontier):
+        config.log("[Info] Yield report (this run):")
+        for layer, st in self.layer_stats.items():
+            per_new = f"{st['queries'] / st['new']:.2f}" if st["new"] else "-"
+            config.log(f"   L{layer}: {st['queries']} queries | {st['suggestions']} suggestions | "
+                       f"{st['new']} new slugs | {per_new} queries/new")
+        config.log(f"   Pruned: {frontier.pruned} L3 queries skipped (min novelty {self.min_novelty})")
+
+    async def run_item(self, frontier, item, seed_context):
+        """Fetch + store one (seed, prefix, layer) item, then expand its children"""
+        layer = item[2]
+        suggestions = await self.fetch_suggestions_async(frontier.query(item))
+        new_count = await asyncio.to_thread(self.process_batch, suggestions, seed_context, layer)
+
+        stats = self.layer_stats[layer]
+        stats["queries"] += 1
+        stats["suggestions"] += len(suggestions)
+        stats["new"] += new_count
+
+        # === Layer 2 / Layer 3: Alpha Expansion (Seed + a [+ b]) ===
+        # Dead branch: L2 only echoed slugs we already have -> its L3 would too
+        # (A re-run of a checkpointed item can't tell: its own rows may already be in the filter)
+        prune = layer == 2 and bool(suggestions) and frontier.query(item) not in frontier.resumed \
+            and new_count / len(suggestions) < self.min_novelty
+        if prune:
+            config.log(f"   [Prune] '{frontier.query(item)}' novelty {new_count}/{len(suggestions)} -> skip {len(ALPHABET)} L3 queries")
+        children = frontier.complete(item, suggestions, prune=prune)
+        if frontier.completed % CHECKPOINT_EVERY == 0:
+            await self.checkpoint(frontier)
+        await asyncio.gather(*(self.run_item(frontier, child, seed_context) for child in children))
+
+    async def checkpoint(self, frontier):
+        if self._checkpointing:
+            return
+        self._checkpointing = True
+        try:
+            # Snapshot before flushing: every item it marks done has its rows in the buffer
+            # (or in a flush already under way, which sync() waits for)
+            state = frontier.snapshot()
+            if await asyncio.to_thread(self.writer.sync):
+                frontier.save(state)
+            else:
+                config.log("[Warn] Keyword upsert failed: checkpoint not advanced.", level="WARN")
+        finally:
+            self._checkpointing = False
 
     def process_batch(self, keywords, context, layer):
-        if not keywords: return
+        """Queue a suggestion batch for upsert; returns how many slugs were new (not in DB, not seen this run)"""
+        if not keywords: return 0
         config.log(f"   [L{layer}] Processing {len(keywords)} keywords...")
-        for kw in keywords:
-            self.save_keyword(kw, context)
+        tags = CLASSIFIER.classify_batch(keywords)
+        rows = [self.build_keyword_row(kw, context, tag) for kw, tag in zip(keywords, tags)]
+        new_slugs = set(self.seen.add_new(row["slug"] for row in rows))
+        if self.skip_known:
+            rows = [row for row in rows if row["slug"] in new_slugs]
+        self.writer.add_many(rows)
+        return len(new_slugs)
+
+def merge_stats(paths):
+    """Sum shard stats files (elapsed = slowest shard)"""
+    total = {"seeds": 0, "completed": 0, "pruned": 0, "cache_hits": 0, "cache_misses": 0, "elapsed": 0.0,
+             "layers": {}, "writer": {}}
+    for path in paths:
+        if not os.path.exists(path):
+            config.log(f"[Warn] Missing shard stats: {path}", level="WARN")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            st = json.load(f)
+        for key in ("seeds", "completed", "pruned", "cache_hits", "cache_misses"):
+            total[key] += st.get(key, 0)
+        total["elapsed"] = max(total["elapsed"], st.get("elapsed", 0.0))
+        for layer, counts in st.get("layers", {}).items():
+            merged = total["layers"].setdefault(layer, {})
+            for key, value in counts.items():
+                merged[key] = merged.get(key, 0) + value
+        for key, value in st.get("writer", {}).items():
+            total["writer"][key] = total["writer"].get(key, 0) + value
+    return total
+
+def run_shards(workers, argv, stats_path=STATS_PATH, rate=SCOUT_RATE, burst=SCOUT_BURST):
+    """
+    Launch `workers` local shard processes (same flags + --shard i/n) and merge their stats.
+    They all query Google from this host's IP, so `rate` / `burst` are split between them.
+    """
+    shard_rate = rate / workers
+    shard_burst = max(1, -(-burst // workers))
+    config.log(f"[Info] LAUNCHER: starting {workers} shard workers ({shard_rate:.2f} queries/s, burst {shard_burst} each)...")
+    argv = strip_flag(strip_flag(argv, "--rate"), "--burst") + ["--rate", str(shard_rate), "--burst", str(shard_burst)]
+
+    # Warm the shared seen-slug file once, so the shards only pull a small delta
+    try:
+        SeenSlugFilter.open(create_client(config.supabase_url, config.supabase_key), SEEN_PATH, DB_TABLE)
+    except Exception as e:
+        config.log(f"[Warn] Seen filter warm-up failed: {e}", level="WARN")
+
+    procs = []
+    for i in range(1, workers + 1):
+        cmd = [sys.executable, os.path.abspath(__file__)] + argv + ["--shard", f"{i}/{workers}", "--stats", stats_path]
+        procs.append(subprocess.Popen(cmd))
+    codes = [p.wait() for p in procs]
+
+    total = merge_stats([shard_path(stats_path, (i, workers)) for i in range(1, workers + 1)])
+    elapsed = total["elapsed"] or 1.0
+    queries = sum(layer.get("queries", 0) for layer in total["layers"].values())
+    new = sum(layer.get("new", 0) for layer in total["layers"].values())
+    config.log(f"\n[Info] LAUNCHER: {workers} shards finished (exit codes {codes}).")
+    config.log(f"   Seeds: {total['seeds']} | Items: {total['completed']} | Pruned: {total['pruned']}")
+    config.log(f"   Queries: {queries} ({queries / elapsed:.2f}/s) | New slugs: {new} ({new / elapsed:.2f}/s)")
+    config.log(f"   Writer: {total['writer']} | Cache: {total['cache_hits']} hits / {total['cache_misses']} misses")
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump(total, f)
+    return 0 if all(code == 0 for code in codes) else 1
+
+def strip_flag(argv, flag):
+    """Drop `--flag value` / `--flag=value` from an argv list"""
+    out, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == flag:
+            skip = True
+        elif not arg.startswith(flag + "="):
+            out.append(arg)
+    return out
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grich Miner (Matrix Scout)")
+    parser.add_argument("--limit", type=int, default=None, help="Only mine the first N seeds.")
+    parser.add_argument("--concurrency", type=int, default=SCOUT_CONCURRENCY, help="Autocomplete queries in flight.")
+    parser.add_argument("--rate", type=positive_rate, default=SCOUT_RATE, help="Token bucket refill rate (queries/sec); with --workers, the total split across the shards.")
+    parser.add_argument("--burst", type=int, default=SCOUT_BURST, help="Token bucket capacity (split across --workers shards).")
+    parser.add_argument("--jitter", type=float, default=SCOUT_JITTER, help="Random extra delay per query (sec).")
+    parser.add_argument("--cache-ttl", type=float, default=SUGGEST_CACHE_TTL, help="Suggestion cache TTL in seconds (<= 0: never expire).")
+    parser.add_argument("--no-cache", action="store_true", help="Always query Google, ignore the suggestion cache.")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint.")
+    parser.add_argument("--rewrite-known", action="store_true", help="Upsert every suggestion, even slugs already in the pool.")
+    parser.add_argument("--min-novelty", type=float, default=L3_MIN_NOVELTY, help="Skip L3 under L2 prefixes whose new-slug ratio is lower (0 disables).")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Frontier checkpoint file.")
+    parser.add_argument("--shuffle-seed", type=int, default=None, help="Deterministic alphabet shuffle seed (new runs only).")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Mine only shard i of n (e.g. 2/4), by stable seed hash.")
+    parser.add_argument("--workers", type=int, default=1, help="Launch N local shard processes and merge their stats.")
+    parser.add_argument("--stats", default=None, help="Write run stats JSON here (per-shard suffix added).")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if args.shard:
+            parser.error("--workers and --shard are mutually exclusive.")
+        sys.exit(run_shards(args.workers, strip_flag(strip_flag(sys.argv[1:], "--workers"), "--stats"),
+                            args.stats or STATS_PATH, args.rate, args.burst))
+
     try:
-        miner = GrichMiner()
-        miner.recursive_mine()
+        miner = GrichMiner(concurrency=args.concurrency, rate=args.rate, burst=args.burst, jitter=args.jitter,
+                           cache_ttl=args.cache_ttl, use_cache=not args.no_cache, min_novelty=args.min_novelty,
+                           skip_known=not args.rewrite_known)
+        miner.recursive_mine(limit=args.limit, resume=args.resume, checkpoint_path=args.checkpoint,
+                             shuffle_seed=args.shuffle_seed, shard=args.shard, stats_path=args.stats)
     except Exception as e:
         config.log(f"[Error] CRITICAL FAILURE: {e}", level="ERROR")
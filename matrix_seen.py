@@ -0,0 +1,143 @@
+import os
+import sys
+import heapq
+import struct
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left
+from matrix_cache import CACHE_DIR
+
+# ================= Seen-Slug Filter =================
+# Compact set of every slug already in grich_keywords_pool, shared by the scout
+# and gsc_miner so known keywords are dropped before any DB write.
+# Storage: sorted array of 64-bit slug hashes (8 bytes/slug, ~8 MB per million),
+# persisted locally together with the highest row id it has seen.
+DB_TABLE = "grich_keywords_pool"
+SEEN_PATH = os.path.join(CACHE_DIR, "seen_slugs.bin")
+PAGE_SIZE = 1000
+MERGE_EVERY = 100000   # Fold fetched hashes into the sorted array every N rows
+
+_MAGIC = b"SEENv1\x00\x00"
+_HEADER = struct.Struct("<8sqQ")   # magic, id watermark, count
+
+def slug_hash(slug):
+    return int.from_bytes(hashlib.blake2b(slug.encode("utf-8"), digest_size=8).digest(), "little")
+
+class SeenSlugFilter:
+    """
+    `hashes` mirrors the DB (loaded from disk, refreshed by id watermark) and is
+    the only part that gets saved. `local` holds slugs added during this run,
+    which may never reach the DB, so they are kept in memory only.
+    """
+    def __init__(self, path=SEEN_PATH):
+        self.path = path
+        self.hashes = array("Q")
+        self.watermark = 0
+        self.local = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes) + len(self.local)
+
+    def _in_db(self, h):
+        i = bisect_left(self.hashes, h)
+        return i < len(self.hashes) and self.hashes[i] == h
+
+    def __contains__(self, slug):
+        h = slug_hash(slug)
+        with self._lock:
+            return h in self.local or self._in_db(h)
+
+    def add(self, slug):
+        with self._lock:
+            self.local.add(slug_hash(slug))
+
+    def add_new(self, slugs):
+        """Atomically keep the unseen slugs and mark them seen; returns them."""
+        new = []
+        with self._lock:
+            for slug in dict.fromkeys(slugs):
+                h = slug_hash(slug)
+                if h not in self.local and not self._in_db(h):
+                    self.local.add(h)
+                    new.append(slug)
+        return new
+
+    def filter_new(self, slugs):
+        """Unseen slugs, without marking them"""
+        return [slug for slug in dict.fromkeys(slugs) if slug not in self]
+
+    def _merge(self, fetched):
+        """Fold a batch of hashes into the sorted array (streamed, deduped)."""
+        merged = array("Q")
+        last = None
+        for h in heapq.merge(self.hashes, sorted(fetched)):
+            if h != last:
+                merged.append(h)
+                last = h
+        with self._lock:
+            self.hashes = merged
+
+    def refresh(self, supabase, table=DB_TABLE, page_size=PAGE_SIZE):
+        """Pull rows with id > watermark; returns how many rows were read."""
+        fetched = []
+        read = 0
+        while True:
+            res = supabase.table(table).select("id, slug")\
+                .gt("id", self.watermark)\
+                .order("id")\
+                .limit(page_size)\
+                .execute()
+            if not res.data:
+                break
+            for row in res.data:
+                if row.get("slug"):
+                    fetched.append(slug_hash(row["slug"]))
+            self.watermark = max(self.watermark, res.data[-1]["id"])
+            read += len(res.data)
+            if len(fetched) >= MERGE_EVERY:
+                self._merge(fetched)
+                fetched = []
+            if len(res.data) < page_size:
+                break
+        if fetched:
+            self._merge(fetched)
+        return read
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as f:
+            magic, watermark, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                return False
+            hashes = array("Q")
+            hashes.frombytes(f.read(count * hashes.itemsize))
+        if sys.byteorder == "big":
+            hashes.byteswap()
+        self.hashes, self.watermark = hashes, watermark
+        return True
+
+    def save(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        hashes = self.hashes
+        if sys.byteorder == "big":
+            hashes = array("Q", hashes)
+            hashes.byteswap()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"   # Shard processes may save concurrently
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.watermark, len(hashes)))
+            f.write(hashes.tobytes())
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def open(cls, supabase, path=SEEN_PATH, table=DB_TABLE, rebuild=False):
+        """Load the local copy, pull only rows added since it was saved, save again."""
+        seen = cls(path)
+        if not rebuild:
+            seen.load()
+        seen.refresh(supabase, table)
+        seen.save()
+        return seen
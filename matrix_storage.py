@@ -0,0 +1,74 @@
+# ================= Document Store Layout =================
+# Where stored documents live; shared by the librarian (writes), the refiner
+# (reads) and verify_pdf_uploads.py, so none of them has to import another.
+STORAGE_BUCKET = "raw-handbooks"
+# Content-addressed store (see db_migration_source_documents.py)
+DOCUMENTS_TABLE = "source_documents"
+DOCUMENT_URLS_TABLE = "document_urls"
+DOC_PREFIX = "docs"
+
+def doc_storage_path(doc_hash):
+    """Storage object for a document: one per unique content, shared by every keyword"""
+    return f"{DOC_PREFIX}/{doc_hash}.pdf"
+
+# ================= Storage Reconciliation =================
+# Verifies uploads in bulk: one paged listing of the bucket (names + sizes)
+# instead of a HEAD request per object, then re-queues whatever is missing.
+LIST_PAGE_SIZE = 1000
+UPDATE_CHUNK = 100   # Values per .in_() filter, keeps the request URL short
+
+def list_bucket_objects(supabase, bucket, prefix="", page_size=LIST_PAGE_SIZE):
+    """{object path: size in bytes} for every object directly under `prefix`"""
+    objects = {}
+    offset = 0
+    while True:
+        page = supabase.storage.from_(bucket).list(prefix or None, {
+            "limit": page_size,
+            "offset": offset,
+            "sortBy": {"column": "name", "order": "asc"}
+        })
+        for item in page:
+            metadata = item.get("metadata")
+            if item.get("id") is None and not metadata:
+                continue   # Folder placeholder
+            name = f"{prefix}/{item['name']}" if prefix else item["name"]
+            objects[name] = (metadata or {}).get("size")
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return objects
+
+def reconcile(expected, listed):
+    """expected / listed: {path: size}. Returns (verified, missing) path lists; a size mismatch counts as missing."""
+    verified, missing = [], []
+    for path, size in expected.items():
+        if path in listed and (size is None or listed[path] is None or listed[path] == size):
+            verified.append(path)
+        else:
+            missing.append(path)
+    return verified, missing
+
+def _chunks(values, size=UPDATE_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def requeue_missing(supabase, doc_hashes=(), slugs=(), documents_table=DOCUMENTS_TABLE,
+                    document_urls_table=DOCUMENT_URLS_TABLE):
+    """
+    Bulk-mark keywords whose stored file is missing so the librarian downloads
+    them again. Content-addressed documents (`doc_hashes`) are also dropped from
+    the document tables so nothing short-circuits to the missing object;
+    `slugs` covers legacy rows stored as {slug}.pdf. Returns rows re-queued.
+    """
+    retry = {"is_downloaded": False, "state": "upload_missing"}
+    requeued = 0
+    for chunk in _chunks(doc_hashes):
+        res = supabase.table("grich_keywords_pool").update(retry).in_("doc_hash", chunk).execute()
+        requeued += len(res.data or [])
+        supabase.table(document_urls_table).delete().in_("doc_hash", chunk).execute()
+        supabase.table(documents_table).delete().in_("doc_hash", chunk).execute()
+    for chunk in _chunks(slugs):
+        res = supabase.table("grich_keywords_pool").update(retry).in_("slug", chunk).execute()
+        requeued += len(res.data or [])
+    return requeued
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from matrix_cache import TTLCache, normalize_query, CACHE_DIR
+from matrix_http import get_client
+
+# ================= Shared Tavily Client =================
+# Every script that searches Tavily goes through here, so reruns, retries and
+# audits share one persistent result cache (and one key rotation policy).
+TAVILY_URL = "https://api.tavily.com/search"
+SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "tavily_search.sqlite")
+SEARCH_CACHE_TTL = float(os.environ.get("TAVILY_CACHE_TTL", 14 * 24 * 3600))  # Seconds; <= 0 never expires
+# Key pool: 429 -> cooldown (doubling per consecutive hit), 401/403 -> key disabled,
+# 432/433 (plan / pay-as-you-go limit) -> key exhausted for the month
+RATE_LIMIT_STATUS = (429,)
+INVALID_KEY_STATUS = (401, 403)
+QUOTA_STATUS = (432, 433)
+KEY_COOLDOWN = float(os.environ.get("TAVILY_KEY_COOLDOWN", 30))           # Seconds, first 429
+KEY_MAX_COOLDOWN = float(os.environ.get("TAVILY_KEY_MAX_COOLDOWN", 900))  # Seconds, cap
+KEY_QUOTA = int(os.environ.get("TAVILY_KEY_QUOTA", 0))   # Credits per key per month; 0 = not tracked
+KEY_USAGE_PATH = os.path.join(CACHE_DIR, "tavily_key_usage.json")
+DEPTH_CREDITS = {"basic": 1, "advanced": 2}
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_search_cache():
+    """Process-wide search cache (opened on first use)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TTLCache(SEARCH_CACHE_PATH, SEARCH_CACHE_TTL)
+        return _shared_cache
+
+def search_cache_key(query, search_depth, max_results, **params):
+    """(normalized query, depth, max_results) plus any other request params, e.g. include_domains"""
+    extra = json.dumps(params, sort_keys=True) if params else ""
+    return f"{normalize_query(query)}|{search_depth}|{max_results}|{extra}"
+
+class TavilyError(Exception):
+    def __init__(self, status_code, message=""):
+        prefix = f"Tavily HTTP {status_code}" if status_code is not None else "Tavily:"
+        super().__init__(f"{prefix} {message}".strip())
+        self.status_code = status_code
+
+class KeyPoolExhausted(TavilyError):
+    def __init__(self):
+        super().__init__(None, "no usable key left (all disabled or out of quota)")
+
+def key_id(key):
+    """Short stable id for logs and the usage ledger (never store the key itself)"""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+
+class TavilyKey:
+    """Health and usage of one API key"""
+    def __init__(self, key, used=0):
+        self.key = key
+        self.id = key_id(key)
+        self.used = used            # Credits spent this month (ledger + this run, incl. in-flight reservations)
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_limits = 0
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.disabled = None        # Reason string once the key must not be used again
+
+    def remaining(self, quota):
+        return quota - self.used if quota > 0 else None
+
+    def usable(self, quota, credits=1):
+        return self.disabled is None and (quota <= 0 or self.used + credits <= quota)
+
+    def stats(self, quota):
+        return {
+            "key": self.id,
+            "requests": self.requests,
+            "credits_used": self.used,
+            "remaining": self.remaining(quota),
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "cooldown_s": round(max(0.0, self.cooldown_until - time.time()), 1),
+            "disabled": self.disabled,
+        }
+
+class KeyPool:
+    """
+    Hands out the healthy key with the fewest requests in flight (then the most
+    quota left), so concurrent searches use every key at once. Rate-limited keys
+    cool down with exponential backoff; acquire() waits for the earliest one when
+    nothing else is available and raises KeyPoolExhausted when no key can recover.
+    With a quota set, credits spent are kept per key per month in KEY_USAGE_PATH.
+    """
+    def __init__(self, keys, quota=KEY_QUOTA, cooldown=KEY_COOLDOWN, max_cooldown=KEY_MAX_COOLDOWN,
+                 usage_path=KEY_USAGE_PATH):
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys:
+            raise ValueError("Critical: TAVILY_KEY is missing. Search cannot proceed.")
+        self.quota = quota
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.usage_path = usage_path if quota > 0 else None
+        self.month = datetime.now(timezone.utc).strftime("%Y-%m")
+        ledger = self._load_usage()
+        self.keys = [TavilyKey(k, ledger.get(key_id(k), 0)) for k in keys]
+        self._cond = threading.Condition()
+        self._turn = 0
+
+    def _load_usage(self):
+        if not self.usage_path or not os.path.exists(self.usage_path):
+            return {}
+        try:
+            with open(self.usage_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("credits", {}) if data.get("month") == self.month else {}
+
+    def _save_usage(self):
+        if not self.usage_path:
+            return
+        if os.path.dirname(self.usage_path):
+            os.makedirs(os.path.dirname(self.usage_path), exist_ok=True)
+        tmp_path = f"{self.usage_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"month": self.month, "credits": {k.id: k.used for k in self.keys}}, f)
+        os.replace(tmp_path, self.usage_path)
+
+    def acquire(self, credits=1):
+        """Reserve `credits` on the best available key (blocks while all usable keys cool down)."""
+        with self._cond:
+            while True:
+                usable = [k for k in self.keys if k.usable(self.quota, credits)]
+                if not usable:
+                    raise KeyPoolExhausted()
+                now = time.time()
+                ready = [k for k in usable if k.cooldown_until <= now]
+                if ready:
+                    # Rotate the tie-break start so equally idle keys share the load
+                    self._turn += 1
+                    n = len(self.keys)
+                    order = {k.id: (i - self._turn) % n for i, k in enumerate(self.keys)}
+                    key = min(ready, key=lambda k: (k.in_flight, -(k.remaining(self.quota) or 0), order[k.id]))
+                    key.in_flight += 1
+                    key.used += credits
+                    return key
+                self._cond.wait(min(k.cooldown_until for k in usable) - now)
+
+    def release(self, key, status_code=None, credits=1):
+        """Report how a request on `key` ended (status None = network error); failures refund the credits."""
+        with self._cond:
+            key.in_flight -= 1
+            key.requests += 1
+            if status_code != 200:
+                key.used -= credits
+            if status_code == 200:
+                key.consecutive_limits = 0
+                self._save_usage()
+            elif status_code in RATE_LIMIT_STATUS:
+                key.rate_limited += 1
+                key.errors += 1
+                delay = min(self.max_cooldown, self.cooldown * 2 ** key.consecutive_limits)
+                key.consecutive_limits += 1
+                key.cooldown_until = time.time() + delay
+                print(f"   ⏳ Tavily key {key.id} rate limited, cooling down {delay:.0f}s")
+            elif status_code in INVALID_KEY_STATUS:
+                key.errors += 1
+                key.disabled = f"HTTP {status_code}"
+                print(f"   🚫 Tavily key {key.id} disabled ({key.disabled})")
+            elif status_code in QUOTA_STATUS:
+                key.errors += 1
+                key.disabled = "quota exhausted"
+                print(f"   🚫 Tavily key {key.id} out of quota")
+            else:
+                key.errors += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return [k.stats(self.quota) for k in self.keys]
+
+    def summary(self):
+        parts = []
+        for s in self.stats():
+            state = s["disabled"] or ("out of quota" if s["remaining"] is not None and s["remaining"] <= 0 else
+                                      f"cooling {s['cooldown_s']}s" if s["cooldown_s"] else "ok")
+            quota = f", {s['remaining']} left" if s["remaining"] is not None else ""
+            parts.append(f"{s['key']}: {s['requests']} req, {s['rate_limited']} x429{quota} [{state}]")
+        return " | ".join(parts)
+
+class TavilyClient:
+    """
+    Tavily search through a KeyPool and the shared persistent cache.
+    A rate-limited / rejected key is reported to the pool and the search is
+    retried on the next key the pool hands out. Only successful responses are cached.
+    """
+    def __init__(self, keys, use_cache=True, timeout=15, pool=None):
+        self.pool = pool or KeyPool(keys)
+        self.timeout = timeout
+        # Keep-alive to api.tavily.com; concurrency is bounded by the key pool / search slots, not per host
+        self.http = get_client(verify=True, per_host=0)
+        self.cache = get_search_cache() if use_cache else None
+
+    def _post(self, payload, timeout):
+        credits = DEPTH_CREDITS.get(payload.get("search_depth"), 1)
+        # One attempt per key, plus one so a single cooled-down key gets its retry
+        for _ in range(len(self.pool.keys) + 1):
+            key = self.pool.acquire(credits)
+            try:
+                res = self.http.post(TAVILY_URL, json={**payload, "api_key": key.key}, timeout=timeout)
+            except Exception:
+                self.pool.release(key, None, credits)
+                raise
+            self.pool.release(key, res.status_code, credits)
+            if res.status_code == 200:
+                return res.json()
+            if res.status_code not in RATE_LIMIT_STATUS + INVALID_KEY_STATUS + QUOTA_STATUS:
+                break
+        raise TavilyError(res.status_code, res.text[:200])
+
+    def search(self, query, max_results=1, search_depth="advanced", timeout=None, **params):
+        """Response JSON for a search (from cache when fresh). Raises TavilyError / requests errors."""
+        key = search_cache_key(query, search_depth, max_results, **params)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        payload = {"query": query, "max_results": max_results, "search_depth": search_depth, **params}
+        data = self._post(payload, timeout or self.timeout)
+        if self.cache is not None:
+            self.cache.set(key, data)
+        return data
+
+    def cache_summary(self):
+        return self.cache.summary() if self.cache is not None else "disabled"
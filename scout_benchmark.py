@@ -0,0 +1,241 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import matrix_scout
+from matrix_scout import GrichMiner
+from matrix_seen import SeenSlugFilter
+
+# ================= Scout Benchmark (Offline) =================
+# Runs GrichMiner against a local stub of complete/search?client=chrome and a
+# fake upsert sink, then reports queries/sec, keywords/sec, p50/p95 latency and
+# the duplicate ratio. No Google, no Supabase: judge every scout change by these.
+# ==============================================================
+
+VOCAB = ["requirements", "application", "fees", "renewal", "reciprocity", "exam", "online", "lookup",
+         "verification", "transfer", "compact", "endorsement", "checklist", "timeline", "cost", "form",
+         "ceu", "waiver", "temporary", "permit", "board", "practice", "background check", "processing time"]
+
+def _h(*parts):
+    return int(hashlib.md5("|".join(parts).encode("utf-8")).hexdigest(), 16)
+
+class AutocompleteStub(ThreadingHTTPServer):
+    """
+    Local stand-in for Google Autocomplete. Answers are deterministic per query:
+    `fanout` suggestions drawn from a vocabulary of `vocab` words (smaller vocab
+    -> more duplicates), `empty_rate` of queries return nothing, `error_rate`
+    answer 429, and every request sleeps latency +- jitter seconds.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, jitter=0.02, fanout=8, vocab=len(VOCAB) * 20, empty_rate=0.3, error_rate=0.0):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fanout = fanout
+        self.vocab = vocab
+        self.empty_rate = empty_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/complete/search"
+
+    def suggest(self, query):
+        if _h("empty", query) % 1000 < self.empty_rate * 1000:
+            return []
+        base = " ".join(query.split()[:3])
+        words = []
+        for k in range(self.fanout):
+            n = _h(query, str(k)) % self.vocab
+            words.append(f"{base} {VOCAB[n % len(VOCAB)]}" + (f" {n // len(VOCAB)}" if n >= len(VOCAB) else ""))
+        return words
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server
+        with stub._lock:
+            stub.requests += 1
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        time.sleep(max(0.0, random.gauss(stub.latency, stub.jitter)))
+
+        if random.random() < stub.error_rate:
+            self.send_response(429)
+            self.end_headers()
+            return
+        body = json.dumps([query, stub.suggest(query)]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+class _FakeQuery:
+    """One builder chain per call, so concurrent flushes don't share state"""
+    def __init__(self, sink, rows=None):
+        self.sink = sink
+        self.rows = rows
+
+    def gt(self, *args): return self
+    def order(self, *args, **kwargs): return self
+    def limit(self, *args): return self
+
+    def execute(self):
+        if self.rows is None:
+            return _FakeResult([])
+        time.sleep(self.sink.write_latency)
+        with self.sink._lock:
+            self.sink.calls += 1
+            self.sink.rows += len(self.rows)
+            self.sink.slugs.update(row["slug"] for row in self.rows)
+        return _FakeResult(self.rows)
+
+class FakeUpsertSink:
+    """Minimal supabase-client look-alike: records upserts, returns empty selects"""
+    def __init__(self, write_latency=0.0):
+        self.write_latency = write_latency
+        self.calls = 0
+        self.rows = 0
+        self.slugs = set()
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        return _FakeQuery(self, rows if isinstance(rows, list) else [rows])
+
+    def select(self, *args):
+        return _FakeQuery(self)
+
+class BenchMiner(GrichMiner):
+    """GrichMiner with timed requests, synthetic seeds and an empty seen filter"""
+    def __init__(self, seeds, **kwargs):
+        super().__init__(**kwargs)
+        self.bench_seeds = seeds
+        self.latencies = []
+        self.suggestions_total = 0
+        self._bench_lock = threading.Lock()
+
+    def load_csv_seeds(self):
+        return list(self.bench_seeds)
+
+    def load_seen_slugs(self):
+        self.seen = SeenSlugFilter(os.devnull)
+
+    def query_autocomplete(self, query):
+        t0 = time.perf_counter()
+        try:
+            result = super().query_autocomplete(query)
+            with self._bench_lock:
+                self.suggestions_total += len(result)
+            return result
+        finally:
+            with self._bench_lock:
+                self.latencies.append(time.perf_counter() - t0)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+SEED_TEMPLATES = ["nursing license reciprocity {}", "cpa license transfer {}", "teacher certification {}",
+                  "electrician license {}", "real estate license reciprocity {}"]
+BENCH_STATES = ["texas", "ohio", "florida", "california", "new york", "oregon", "utah", "georgia"]
+
+def make_seeds(n):
+    return [SEED_TEMPLATES[i % len(SEED_TEMPLATES)].format(BENCH_STATES[i // len(SEED_TEMPLATES) % len(BENCH_STATES)])
+            for i in range(n)]
+
+def run_benchmark(seeds=3, concurrency=8, rate=200.0, burst=20, min_novelty=matrix_scout.L3_MIN_NOVELTY,
+                  latency=0.05, jitter=0.02, fanout=8, vocab=480, empty_rate=0.3, error_rate=0.0,
+                  write_latency=0.01, flush_size=matrix_scout.FLUSH_SIZE, quiet=True):
+    stub = AutocompleteStub(latency, jitter, fanout, vocab, empty_rate, error_rate).start()
+    sink = FakeUpsertSink(write_latency)
+    miner = BenchMiner(make_seeds(seeds), concurrency=concurrency, rate=rate, burst=burst, jitter=0.0,
+                       use_cache=False, min_novelty=min_novelty, supabase=sink)
+    miner.autocomplete_url = stub.url
+    miner.writer.flush_size = flush_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = io.StringIO() if quiet else sys.stdout
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(out):
+            miner.recursive_mine(checkpoint_path=os.path.join(tmp, "frontier.json"), shuffle_seed=0,
+                                 stats_path=os.path.join(tmp, "stats.json"))
+        elapsed = time.perf_counter() - t0
+        with open(os.path.join(tmp, "stats.json"), "r", encoding="utf-8") as f:
+            run_stats = json.load(f)
+    stub.shutdown()
+
+    queries = len(miner.latencies)
+    return {
+        "seeds": seeds,
+        "elapsed_s": round(elapsed, 3),
+        "queries": queries,
+        "queries_per_s": round(queries / elapsed, 2),
+        "keywords_written": sink.rows,
+        "keywords_per_s": round(sink.rows / elapsed, 2),
+        "unique_slugs": len(sink.slugs),
+        "latency_p50_ms": round(percentile(miner.latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(miner.latencies, 95) * 1000, 1),
+        "duplicate_ratio": round(1 - len(sink.slugs) / miner.suggestions_total, 4) if miner.suggestions_total else 0.0,
+        "pruned_queries": run_stats["pruned"],
+        "upsert_calls": sink.calls,
+        "stub_requests": stub.requests,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline scout throughput benchmark")
+    parser.add_argument("--seeds", type=int, default=3, help="Synthetic seeds to mine.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=200.0, help="Token bucket rate (queries/sec).")
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--min-novelty", type=float, default=matrix_scout.L3_MIN_NOVELTY)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub mean latency (sec).")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Stub latency std dev (sec).")
+    parser.add_argument("--fanout", type=int, default=8, help="Suggestions per non-empty answer.")
+    parser.add_argument("--vocab", type=int, default=480, help="Distinct suggestion tails (lower = more duplicates).")
+    parser.add_argument("--empty-rate", type=float, default=0.3, help="Share of queries with no suggestions.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of queries answered with 429.")
+    parser.add_argument("--write-latency", type=float, default=0.01, help="Fake upsert latency per call (sec).")
+    parser.add_argument("--flush-size", type=int, default=matrix_scout.FLUSH_SIZE)
+    parser.add_argument("--json", default=None, help="Also write the report to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the scout's own log output.")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.seeds, args.concurrency, args.rate, args.burst, args.min_novelty,
+                           args.latency, args.jitter, args.fanout, args.vocab, args.empty_rate, args.error_rate,
+                           args.write_latency, args.flush_size, quiet=not args.verbose)
+
+    print("=" * 60)
+    print("      SCOUT BENCHMARK (local autocomplete stub)      ")
+    print("=" * 60)
+    for key, value in report.items():
+        print(f"{key:<18}: {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import time
+
+# Ensure we can import from current directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PyPDF2 import PdfWriter
+from matrix_extract import ExtractionEngine, ExtractionError
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+def test_dead_worker_is_replaced():
+    """A worker that dies while idle must not swallow the next page range"""
+    engine = ExtractionEngine(2, 4, doc_timeout=10)
+    try:
+        victim = engine._workers[0].process
+        victim.kill()
+        victim.join(5)
+
+        started = time.time()
+        result = engine.extract(blank_pdf(12))
+        elapsed = time.time() - started
+
+        assert not result["extraction_timeout"], result["missing_pages"]
+        assert result["scanned_pages"] == 12
+        assert elapsed < 10, f"waited for the document deadline ({elapsed:.1f}s)"
+        assert engine.recycled >= 1
+        assert all(w.process.is_alive() for w in engine._workers)
+    finally:
+        engine.shutdown()
+
+def test_supervisor_failure_fails_open_jobs():
+    """A crashed supervisor must fail the jobs waiting on it, not leave result() blocked"""
+    engine = ExtractionEngine(1, 4, doc_timeout=0)
+    try:
+        def broken(*message):
+            raise RuntimeError("boom")
+        engine._handle = broken
+        started = time.time()
+        try:
+            engine.extract(blank_pdf(4))
+        except ExtractionError as e:
+            assert "boom" in str(e)
+        else:
+            raise AssertionError("extract() returned after the supervisor died")
+        assert time.time() - started < 10
+        assert engine.closed
+    finally:
+        engine.shutdown()
+
+if __name__ == "__main__":
+    test_dead_worker_is_replaced()
+    test_supervisor_failure_fails_open_jobs()
+    print("[SUCCESS] Dead extraction worker recycled, no pages lost; supervisor failure surfaces.")
@@ -1,9 +1,9 @@
-import requests
 import json
 import os
-from bs4 import BeautifulSoup
 from matrix_refiner import MatrixRefiner
 from matrix_config import config
+from matrix_http import get_client
+from matrix_html import extract_main_text
 
 # Initialize Refiner (reusing existing config logic)
 # This requires valid config environment
@@ -28,21 +28,12 @@ def fetch_and_clean_html(url):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     try:
-        res = requests.get(url, headers=headers, timeout=15, verify=False)
+        # Shared keep-alive pool; verify=False for gov sites with broken certificates
+        res = get_client(verify=False).get(url, headers=headers, timeout=15)
         res.raise_for_status()
         
-        soup = BeautifulSoup(res.content, 'html.parser')
-        
-        # Remove scripts and styles
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-            
-        text = soup.get_text(separator="\n")
-        
-        # Basic cleanup
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        # Same main-content extraction the librarian applies before storing HTML sources
+        text = extract_main_text(res.content)
         
         return text
     except Exception as e:
@@ -1,6 +1,9 @@
 import os
 import sys
+import argparse
 from supabase import create_client
+from matrix_storage import (list_bucket_objects, reconcile, requeue_missing, doc_storage_path,
+                            STORAGE_BUCKET, DOC_PREFIX, DOCUMENTS_TABLE, DOCUMENT_URLS_TABLE)
 
 # Force UTF-8 output
 sys.stdout.reconfigure(encoding='utf-8')
@@ -26,53 +29,69 @@ def get_credentials():
         return config.get('url'), config.get('key')
     return None, None
 
-def main():
+PAGE_SIZE = 1000
+
+def fetch_all(query_fn, page_size=PAGE_SIZE):
+    """Page through a select (PostgREST caps a single response at 1000 rows)"""
+    rows = []
+    offset = 0
+    while True:
+        page = query_fn().range(offset, offset + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+def main(fix=False):
     url, key = get_credentials()
     if not url or not key:
         print("❌ Credentials not found")
         return
 
     supabase = create_client(url, key)
-    BUCKET = "raw-handbooks"
 
-    print(f"🔍 Verifying uploads in bucket '{BUCKET}'...")
+    print(f"🔍 Verifying uploads in bucket '{STORAGE_BUCKET}'...")
 
-    # 1. Get list of files in bucket (with pagination/limit)
+    # 1. List storage in pages: legacy {slug}.pdf at the root, content-addressed objects under docs/
     try:
-        # Default limit is 100, increase to 1000
-        files = supabase.storage.from_(BUCKET).list(path=None, options={"limit": 1000, "offset": 0})
-        file_names = [f['name'] for f in files]
-        print(f"✅ Found {len(file_names)} files in storage.")
+        listed = list_bucket_objects(supabase, STORAGE_BUCKET)
+        listed.update(list_bucket_objects(supabase, STORAGE_BUCKET, DOC_PREFIX))
+        print(f"✅ Found {len(listed)} files in storage.")
     except Exception as e:
         print(f"❌ Failed to list storage files: {e}")
         return
 
-    # 2. Get downloaded tasks from DB
-    res = supabase.table("grich_keywords_pool").select("slug").eq("is_downloaded", True).execute()
-    db_slugs = {item['slug'] for item in res.data}
-    print(f"✅ Found {len(db_slugs)} marked as downloaded in DB.")
+    # 2. Downloaded PDF tasks from DB (HTML sources live in content_raw, not in the bucket)
+    rows = fetch_all(lambda: supabase.table("grich_keywords_pool")
+                     .select("id, slug, doc_hash, file_type")
+                     .eq("is_downloaded", True)
+                     .order("id"))
+    rows = [r for r in rows if r.get("file_type") != "html"]
+    sizes = {d["doc_hash"]: d.get("size_bytes") for d in fetch_all(
+        lambda: supabase.table(DOCUMENTS_TABLE).select("doc_hash, size_bytes").order("doc_hash"))}
+    print(f"✅ Found {len(rows)} PDF tasks marked as downloaded in DB.")
 
-    # 3. Cross-reference
-    missing_in_storage = []
-    for slug in db_slugs:
-        expected_file = f"{slug}.pdf"
-        if expected_file not in file_names:
-            missing_in_storage.append(slug)
-
-    extra_in_storage = []
-    for fname in file_names:
-        if not fname.endswith(".pdf"): continue
-        slug = fname[:-4]
-        if slug not in db_slugs:
-            extra_in_storage.append(fname)
+    # 3. Cross-reference (name and, where recorded, size)
+    expected = {}
+    owners = {}
+    for row in rows:
+        if row.get("doc_hash"):
+            path = doc_storage_path(row["doc_hash"])
+            expected[path] = sizes.get(row["doc_hash"])
+        else:
+            path = f"{row['slug']}.pdf"
+            expected.setdefault(path, None)
+        owners.setdefault(path, row)
+    _, missing = reconcile(expected, listed)
+    extra_in_storage = sorted(name for name in listed if name.endswith(".pdf") and name not in expected)
 
     # 4. Report
     print("\n📊 Discrepancy Report:")
-    if missing_in_storage:
-        print(f"⚠️  {len(missing_in_storage)} files missing in storage (DB says downloaded):")
-        for s in missing_in_storage[:5]:
-            print(f"   - {s}.pdf")
-        if len(missing_in_storage) > 5: print("   ... and more")
+    if missing:
+        print(f"⚠️  {len(missing)} files missing or incomplete in storage (DB says downloaded):")
+        for path in missing[:5]:
+            print(f"   - {path}")
+        if len(missing) > 5: print("   ... and more")
     else:
         print("✅ All DB downloaded records have corresponding files in storage.")
 
@@ -83,5 +102,17 @@ def main():
     else:
         print("✅ No orphaned files in storage.")
 
+    # 5. Optional bulk repair: send missing ones back to the librarian
+    if missing and fix:
+        doc_hashes = {owners[path]["doc_hash"] for path in missing if owners[path].get("doc_hash")}
+        slugs = {owners[path]["slug"] for path in missing if not owners[path].get("doc_hash")}
+        requeued = requeue_missing(supabase, doc_hashes, slugs,
+                                   documents_table=DOCUMENTS_TABLE, document_urls_table=DOCUMENT_URLS_TABLE)
+        print(f"🔁 Re-queued {requeued} keywords for download.")
+    elif missing:
+        print("ℹ️  Run with --fix to re-queue them for download.")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Reconcile downloaded rows against the storage bucket")
+    parser.add_argument("--fix", action="store_true", help="Mark keywords with missing files for re-download.")
+    main(parser.parse_args().fix)